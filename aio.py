@@ -0,0 +1,183 @@
+"""The part of Flask-SocketIO server.py uses, on asyncio (RUNTIME=asyncio).
+
+With RUNTIME=asyncio, server.py imports SocketIO, emit, join_room,
+leave_room and disconnect from here instead of flask_socketio and runs
+without eventlet or monkey-patching. The handlers and the rules behind
+them are the same code in both runtimes. Game is an event-driven state machine and never
+blocks, so each handler runs to the end inside its coroutine on the
+event loop. Like Flask-SocketIO, it runs in a Flask request context with
+request.sid set.
+
+Emits, room joins and disconnects are not awaited in the handler. They
+go into an asyncio.Queue that one task drains in order, so packets leave
+in the order they were emitted and every room change lands between the
+same packets it did in the handler. Each is sent in a copy of the
+context (contextvars) it was queued from, so whatever the handler had
+set, such as the room server.py counts packets against, still holds when
+the packet is encoded. Timers run on the same loop (Scheduler.run_async).
+
+The ASGI app serves Socket.IO and, for every other path, calls the Flask
+app inline: the page, assets, /metrics and /stats only read memory.
+SocketIO.run() serves it with uvicorn, on uvloop when it is installed.
+
+    pip install -r requirements-asyncio.txt    # uvicorn, and uvloop off Windows
+    RUNTIME=asyncio python server.py
+"""
+import asyncio
+import contextvars
+import io
+import traceback
+
+import socketio
+from flask import current_app, request
+
+try:
+    import uvicorn
+except ImportError:  # only needed to run the server
+    uvicorn = None
+
+try:
+    import uvloop
+except ImportError:  # the stock asyncio loop
+    uvloop = None
+
+
+class SocketIO:
+    def __init__(self, app, message_queue=None, async_mode="asgi", **kwargs):
+        self.app = app
+        app.extensions["socketio"] = self
+        manager = socketio.AsyncRedisManager(message_queue) if message_queue else None
+        self.server = socketio.AsyncServer(async_mode=async_mode, client_manager=manager, **kwargs)
+        self.asgi = socketio.ASGIApp(self.server, other_asgi_app=self.http, on_startup=self.startup)
+        self.outbox = asyncio.Queue()
+        self.environs = {}  # sid -> environ of its connect request
+        self.tasks = [self.send_loop]
+
+    # handlers
+    def on(self, event):
+        def decorator(fn):
+            if event == "connect":
+                async def handler(sid, environ, auth=None):
+                    self.environs[sid] = environ
+                    return self.call(sid, fn, (auth,))
+            elif event == "disconnect":
+                async def handler(sid, *reason):
+                    try:
+                        return self.call(sid, fn, ())
+                    finally:
+                        self.environs.pop(sid, None)
+            else:
+                async def handler(sid, *args):
+                    return self.call(sid, fn, args)
+            self.server.on(event, handler)
+            return fn
+        return decorator
+
+    def call(self, sid, fn, args):
+        with self.app.request_context(self.environs.get(sid) or {}):
+            request.sid = sid
+            request.namespace = "/"
+            return fn(*args)
+
+    # sending, in handler order
+    def queue(self, send):
+        self.outbox.put_nowait((contextvars.copy_context(), send))
+
+    def emit(self, event, data=None, to=None, room=None, **kwargs):
+        self.queue(self.server.emit(event, data, to=to or room, **kwargs))
+
+    def enter_room(self, sid, room):
+        self.queue(self.server.enter_room(sid, room))
+
+    def leave_room(self, sid, room):
+        self.queue(self.server.leave_room(sid, room))
+
+    def close_room(self, room):
+        self.queue(self.server.close_room(room))
+
+    def disconnect(self, sid):
+        self.queue(self.server.disconnect(sid))
+
+    async def send_loop(self):
+        while True:
+            context, send = await self.outbox.get()
+            try:
+                await context.run(asyncio.ensure_future, send)
+            except Exception:
+                traceback.print_exc()
+
+    # running
+    def start_background_task(self, target, *args):
+        # coroutine functions, started with the server
+        self.tasks.append(lambda: target(*args))
+
+    async def startup(self):
+        loop = asyncio.get_running_loop()
+        for task in self.tasks:
+            loop.create_task(task())
+
+    async def http(self, scope, receive, send):
+        # one plain WSGI call per request; the routes answer from memory
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        host, port = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", ""),
+            "PATH_INFO": scope["path"],
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": host,
+            "SERVER_PORT": str(port),
+            "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": io.StringIO(),
+            "wsgi.multithread": False,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            key = name.decode("latin-1").upper().replace("-", "_")
+            if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                key = "HTTP_" + key
+            environ[key] = value.decode("latin-1")
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split()[0])
+            started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+        response = self.app(environ, start_response)
+        try:
+            content = b"".join(response)
+        finally:
+            if hasattr(response, "close"):
+                response.close()
+        await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+        await send({"type": "http.response.body", "body": content})
+
+    def run(self, app, host="127.0.0.1", port=5000, **kwargs):
+        if uvicorn is None:
+            raise SystemExit("RUNTIME=asyncio needs an ASGI server: pip install -r requirements-asyncio.txt")
+        uvicorn.run(self.asgi, host=host, port=port, loop="uvloop" if uvloop else "asyncio", log_level="warning")
+
+
+# Flask-SocketIO's module-level helpers, acting for the sid whose handler is running
+def emit(event, data=None, to=None, room=None, **kwargs):
+    current_app.extensions["socketio"].emit(event, data, to=to or room or request.sid, **kwargs)
+
+
+def join_room(room, sid=None, namespace=None):
+    current_app.extensions["socketio"].enter_room(sid or request.sid, room)
+
+
+def leave_room(room, sid=None, namespace=None):
+    current_app.extensions["socketio"].leave_room(sid or request.sid, room)
+
+
+def disconnect(sid=None, namespace=None, silent=False):
+    current_app.extensions["socketio"].disconnect(sid or request.sid)
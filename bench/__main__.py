@@ -0,0 +1,203 @@
+"""Seeded micro-benchmarks of the game engine, with JSON baselines.
+
+Times the card and trick primitives, render() for a full six-seat room and
+a whole game played through RoomGame (the server's rules, journal hooks and
+render, with Socket.IO stubbed out). Every input comes from fixed seeds, so
+two runs do the same work. Each case is the best of --repeat runs, reported
+per operation.
+
+A run is compared with the baseline file and exits 1 if any case got more
+than --tolerance slower. Baselines are per machine: save one before a
+change, then run again after it.
+
+    python -m bench --save                # write bench/baseline.json
+    python -m bench                       # compare with it
+    python -m bench --only get_winner --out run.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import game
+import server
+from bench.tricks import random_trick
+from sim import PLAYERS, SimplePolicy, play_game
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+ROOM = "BENCH"
+
+
+def best(fn, repeat):
+    fn()  # warm up
+    times = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - began)
+    return min(times)
+
+
+def deals(count):
+    return [game.Deck(seed).initialize_deck().shuffle_deck().deal() for seed in range(count)]
+
+
+def card_cases(repeat):
+    n = 2000
+    decks = [game.Deck(seed) for seed in range(n)]
+    hands = [hand for dealt in deals(n // 6 + 1) for hand in dealt][:n]
+    six = deals(n // 6)
+    vals = [game.CARD_VALS[card] for card in range(0, 48, 2)] * (n // 24)
+
+    def shuffle():
+        for deck in decks:
+            deck.deck = list(range(48))
+            deck.shuffle_deck()
+
+    yield "Deck.initialize_deck", best(lambda: [deck.initialize_deck() for deck in decks], repeat) / n
+    yield "Deck.shuffle_deck", best(shuffle, repeat) / n
+    yield "Deck.deal", best(lambda: [game.Deck(seed).initialize_deck().shuffle_deck().deal() for seed in range(n)], repeat) / n
+    yield "sort_hand", best(lambda: [game.sort_hand(hand) for hand in hands], repeat) / n
+    yield "sort_hands", best(lambda: [game.sort_hands(dealt) for dealt in six], repeat) / len(six)
+    yield "gen_card", best(lambda: [game.gen_card(val) for val in vals], repeat) / len(vals)
+    # what update_hands became: a seat's hand as card faces after each change
+    yield "hand_vals", best(lambda: [game.hand_vals(hand) for hand in hands], repeat) / n
+
+
+def trick_cases(repeat):
+    rng = random.Random(4)
+    n = 10000
+    for mode, name in enumerate(game.MODES):
+        tricks = [random_trick(rng, mode, 6) for _ in range(n)]
+        high = game.Bid(8, name)
+        yield f"get_winner[{name}]", best(lambda: [game.get_winner(trick, high) for trick in tricks], repeat) / n
+        if game.numpy is not None:
+            batch = game.numpy.array(tricks, dtype=game.numpy.int8)
+            yield f"get_winners[{name}]", best(lambda: game.get_winners(batch, mode), repeat) / n
+
+
+class TableGame(server.RoomGame):
+    """A RoomGame in the bench room, answered in-process like sim.SimGame."""
+
+    def __init__(self, players, seed=None):
+        super().__init__(ROOM, players)
+        self.random = random.Random(seed)
+        self.pending = None
+        self.records = []
+        self.renders = 0
+        self.render_time = 0
+        room = server.rooms[ROOM]
+        room.update(game=self, table=(0, None, None), hands={})
+
+    def prompt(self, seat, event, data=None):
+        self.pending = (seat, event, data)
+        super().prompt(seat, event, data)
+
+    def changed(self):
+        began = time.perf_counter()
+        super().changed()
+        self.render_time += time.perf_counter() - began
+        self.renders += 1
+
+    def hand_over(self, record):
+        self.records.append(record)
+
+    def later(self, delay, fn):
+        fn()
+
+
+def room():
+    # six seats: five JSON clients and one compact, sockets stubbed out
+    server.socketio.emit = lambda *args, **kwargs: None
+    server.rooms[ROOM] = room = server.new_room("sid0", PLAYERS[0])
+    for seat, name in enumerate(PLAYERS):
+        sid = f"sid{seat}"
+        room["seats"].join(sid, name)
+        room["listeners"]["compact" if seat == 5 else "json"].add(sid)
+    server.wire_formats["sid5"] = "compact"
+    room["seats"].seat(PLAYERS)
+
+
+def table_cases(repeat):
+    room()
+    policies = [SimplePolicy()] * 6
+    seeds = range(5)
+    renders = []
+
+    def games():
+        played = []
+        for seed in seeds:
+            played.append(play_game(policies, seed, game_class=TableGame))
+            server.scheduler.heap.clear()  # the turn timers nobody runs
+        renders.append(sum(table.render_time for table in played) / sum(table.renders for table in played))
+
+    elapsed = best(games, repeat)
+    yield "game (RoomGame, 6 seats)", elapsed / len(seeds)
+    yield "render (6 seats)", min(renders)
+
+
+def run(repeat, only=None):
+    results = {}
+    for cases in (card_cases, trick_cases, table_cases):
+        for name, seconds in cases(repeat):
+            if only is None or only in name:
+                results[name] = seconds * 1e9
+    return results
+
+
+def compare(results, baseline, tolerance):
+    slower = []
+    for name, ns in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:30} {ns:12.0f} ns  (new)")
+            continue
+        ratio = ns / before
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            slower.append(name)
+        print(f"{name:30} {ns:12.0f} ns  {before:12.0f} ns  {ratio:5.2f}x{flag}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="write this run as the baseline")
+    parser.add_argument("--out", help="also write this run's results here")
+    parser.add_argument("--repeat", type=int, default=7, help="runs per case, the best is kept")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="fail when a case is this much slower")
+    parser.add_argument("--only", help="cases whose name contains this")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.only)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "numpy": game.numpy is not None,
+        "results": results,
+    }
+    for path in filter(None, (args.out, args.baseline if args.save else None)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+            f.write("\n")
+    if args.save or not os.path.exists(args.baseline):
+        for name, ns in results.items():
+            print(f"{name:30} {ns:12.0f} ns")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline["python"], baseline["numpy"]) != (report["python"], report["numpy"]):
+        print(f"baseline is from python {baseline['python']}, numpy {baseline['numpy']}", file=sys.stderr)
+    slower = compare(results, baseline["results"], args.tolerance)
+    if slower:
+        print(f"{len(slower)} regressed more than {args.tolerance:.0%}: {', '.join(slower)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
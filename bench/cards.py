@@ -0,0 +1,61 @@
+"""Integer card ids and bitmask hands vs the old Card object model.
+
+See tests/test_tricks.py for get_winner equivalence against the old model.
+
+    python -m bench.cards
+"""
+import timeit
+
+import game
+from bench import legacy
+
+
+def legacy_play_path(hands, vals):
+    # what get_plays + update_hands did for one trick
+    for seat, val in enumerate(vals):
+        legacy.gen_card(val)
+        hands[seat].remove(legacy.gen_card(val))
+        legacy.gen_card(val)
+        [[card.val for card in hand] for hand in hands]
+
+
+def new_play_path(hands, vals):
+    for seat, val in enumerate(vals):
+        rank, suit = val[:-1], val[-1]
+        card = game.find_card(hands[seat], {"rank": rank, "suit": suit})
+        hands[seat] &= ~(1 << card)
+        [game.hand_vals(hand) for hand in hands]
+
+
+def main():
+    def legacy_deal():
+        deck = legacy.Deck().initialize_deck().shuffle_deck()
+        return legacy.sort_hands([[deck.draw_card() for _ in range(8)] for _ in range(6)])
+
+    def new_deal():
+        return game.Deck().initialize_deck().shuffle_deck().deal()
+
+    old_hands = legacy_deal()
+    new_hands = new_deal()
+    old_vals = [hand[0].val for hand in old_hands]
+    new_vals = [game.CARD_VALS[game.sort_hand(hand)[0]] for hand in new_hands]
+    old_trick = [hand[0] for hand in old_hands]
+    new_trick = [game.sort_hand(hand)[0] for hand in new_hands]
+    spades = legacy.Bid(8, "spades")
+
+    cases = [
+        ("deal + sort", legacy_deal, new_deal),
+        ("play a trick", lambda: legacy_play_path([list(h) for h in old_hands], old_vals),
+                         lambda: new_play_path(list(new_hands), new_vals)),
+        ("get_winner", lambda: legacy.get_winner(old_trick, spades),
+                       lambda: game.get_winner(new_trick, spades)),
+    ]
+    for label, old, new in cases:
+        n = 2000
+        t_old = min(timeit.repeat(old, number=n, repeat=5)) / n
+        t_new = min(timeit.repeat(new, number=n, repeat=5)) / n
+        print(f"{label:>14}: objects {t_old * 1e6:8.1f} us   ints {t_new * 1e6:8.1f} us   {t_old / t_new:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
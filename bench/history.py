@@ -0,0 +1,80 @@
+"""Scan speed of the hand-history store: numpy over mapped columns vs struct.
+
+Fills a temporary store with --hands rows (self-play hands repeated to
+size, since only the scan is timed), then times make_rate() and replay()
+over all of it with numpy, and make_rate() over a slice without.
+
+    python -m bench.history --hands 2000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import history
+from sim import SimplePolicy, play_game
+
+
+def fill(path, hands):
+    store = history.History(path)
+    games = [play_game([SimplePolicy()] * 6, seed) for seed in range(20)]
+    records = [(seed, hand, record) for seed, game in enumerate(games) for hand, record in enumerate(game.records)]
+    # write whole segments straight away; append() is one row at a time.
+    # Each pass over the sample games gets new game ids.
+    written = 0
+    number = 0
+    while written < hands:
+        number += 1
+        count = min(history.SEGMENT_HANDS, hands - written)
+        columns = {field: [] for field in history.COLUMNS}
+        for index in range(written, written + count):
+            seed, hand, record = records[index % len(records)]
+            for field, data in history.pack({**record, "game": index // len(records) * len(games) + seed, "hand": hand}).items():
+                columns[field].append(data)
+        os.makedirs(store.name(number))
+        for field, data in columns.items():
+            with open(store.name(number, field), "wb") as f:
+                f.write(b"".join(data))
+        written += count
+    return history.History(path)
+
+
+def timed(label, hands, fn):
+    began = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - began
+    print(f"{label:>22}: {elapsed * 1e3:8.1f} ms, {hands / elapsed / 1e6:6.1f}M hands/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hands", type=int, default=2_000_000)
+    parser.add_argument("--python-hands", type=int, default=200_000, help="rows for the struct fallback")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        store = fill(path, args.hands)
+        size = sum(os.path.getsize(store.name(n, field)) for n in store.numbers() for field in history.COLUMNS)
+        print(f"{len(store)} hands in {len(store.numbers())} segments, {size / 1e6:.1f} MB")
+        if history.numpy is not None:
+            rates = timed("make_rate numpy", args.hands, store.make_rate)
+            timed("replay numpy", args.hands, lambda: store.replay(7))
+        else:
+            print("numpy not installed, skipping the numpy scans")
+            rates = None
+
+        small = os.path.join(path, "small")
+        fill(small, args.python_hands)
+        numpy, history.numpy = history.numpy, None
+        try:
+            fallback = timed("make_rate struct", args.python_hands, history.History(small).make_rate)
+        finally:
+            history.numpy = numpy
+        if rates is not None:
+            check = history.History(small).make_rate()
+            assert check == fallback, (check, fallback)
+
+
+if __name__ == "__main__":
+    main()
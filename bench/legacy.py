@@ -0,0 +1,167 @@
+"""The card model as it was before integer ids, kept for comparisons."""
+import random
+
+
+class Card:
+    __suit_to_symbol = {
+        "spades": "♠",
+        "clubs": "♣",
+        "hearts": "♥",
+        "diamonds": "♦"
+    }
+    __rank_to_symbol = {
+        "9": "9",
+        "10": "10",
+        "jack": "J",
+        "queen": "Q",
+        "king": "K",
+        "ace": "A"
+    }
+
+    def __init__(self, suit, rank):
+        self.suit = suit.lower() if suit else ""
+        self.rank = rank.lower() if rank else ""
+
+        if self.rank in Card.__rank_to_symbol and self.suit in Card.__suit_to_symbol:
+            self.val = f"{Card.__rank_to_symbol[self.rank]}{Card.__suit_to_symbol[self.suit]}"
+        else:
+            self.val = ""
+
+    def __eq__(self, other):
+        return isinstance(other, Card) and self.suit == other.suit and self.rank == other.rank
+
+    def __hash__(self):
+        return hash((self.suit, self.rank))
+
+
+class Deck():
+    def __init__(self):
+        self.deck = []
+
+    def initialize_deck(self):
+        suits = ["diamonds", "hearts", "clubs", "spades"]
+        ranks = ["9", "10", "jack", "queen", "king", "ace"]
+        for _ in range(2):
+            for suit in suits:
+                for rank in range(6):
+                    self.deck.append(Card(suit, ranks[rank]))
+        return self
+
+    def shuffle_deck(self):
+        random.shuffle(self.deck)
+        return self
+
+    def draw_card(self):
+        return self.deck.pop(0)
+
+
+class Bid():
+    def __init__(self, bid, suit):
+        self.bid = bid
+        self.suit = suit
+
+
+def gen_card(val):
+    symbol_to_suit = {
+        "♠": "spades",
+        "♣": "clubs",
+        "♥": "hearts",
+        "♦": "diamonds"
+    }
+    symbol_to_rank = {
+        "9": "9",
+        "10": "10",
+        "J": "jack",
+        "Q": "queen",
+        "K": "king",
+        "A": "ace"
+    }
+    suit_symbol = val[-1]
+    rank_symbol = val[:-1]
+
+    suit = symbol_to_suit[suit_symbol]
+    rank = symbol_to_rank[rank_symbol.upper()]
+
+    return Card(suit, rank)
+
+def sort_hand(hand):
+    new_hand = []
+    suits = ["diamonds", "hearts", "clubs", "spades"]
+    ranks = ["9", "10", "jack", "queen", "king", "ace"]
+    for suit in suits:
+        suit_hand = []
+        for card in hand:
+            if card.suit == suit:
+                suit_hand.append(card)
+        for rank in ranks:
+            for card in suit_hand:
+                if card.rank == rank:
+                    new_hand.append(card)
+    return new_hand
+
+def sort_hands(hands):
+    new_hands = []
+    for hand in hands:
+        new_hands.append(sort_hand(hand))
+    return new_hands
+
+def get_winner(plays, high):
+    high = high.suit.lower()
+    dic = {"diamonds": "hearts", "hearts": "diamonds", "clubs": "spades", "spades": "clubs"}
+    def get_rank(card, high):
+        all_ranks = [["9", "10", "jack", "queen", "king", "ace"], ["9", "10", "queen", "king", "ace", "jack"]]
+        if card.suit == high:
+            rank = all_ranks[1].index(card.rank)
+        else:
+            rank = all_ranks[0].index(card.rank)
+        return rank
+    highest = plays[0]
+    high_index = 0
+    if high == "low":
+        for card in plays[1::]:
+            if get_rank(highest, high) > get_rank(card, high) and card.suit == highest.suit:
+                highest = card
+                high_index = plays.index(card)
+            else:
+               continue
+    elif high == "high":
+        for card in plays[1::]:
+            if get_rank(highest, high) < get_rank(card, high) and card.suit == highest.suit:
+                highest = card
+                high_index = plays.index(card)
+            else:
+                continue
+    else:
+        for card in plays[1::]:
+            if highest.suit != high and card.suit == high:
+                if dic[high] == highest.suit and highest.rank == "jack" and card.rank != "jack":
+                    continue
+                else:
+                    highest = card
+                    high_index = plays.index(card)
+            elif highest.suit == high and card.suit != high:
+                if dic[high] == card.suit and card.rank == "jack" and highest.rank != "jack":
+                    highest = card
+                    high_index = plays.index(card)
+                else:
+                    continue
+            elif highest.suit == high and card.suit == high:
+                if get_rank(highest, high) >= get_rank(card, high):
+                    continue
+                else:
+                    highest = card
+                    high_index = plays.index(card)
+            else:
+                if dic[high] == highest.suit and highest.rank == "jack":
+                    continue
+                else:
+                    if dic[high] == card.suit and card.rank == "jack":
+                        highest = card
+                        high_index = plays.index(card)
+                    else:
+                        if get_rank(highest, high) >= get_rank(card, high):
+                            continue
+                        else:
+                            highest = card
+                            high_index = plays.index(card)
+    return high_index
@@ -0,0 +1,269 @@
+"""Synthetic tables of six Socket.IO clients against a local server.py.
+
+Starts server.py on a free localhost port (or uses --url), then ramps up
+the number of tables. Every table creates a room, joins five more clients,
+starts the game and answers bid_now/play_now/shoot_now/give_shoot on its
+own, starting a new game whenever one ends. After each ramp step it prints
+the round trip of each client action (emit until the server acks it), the
+events per second the clients receive, and the server's RSS, thread count,
+connections and rooms.
+
+--runtime runs the ramp once per server runtime (see RUNTIME in
+server.py), printing how long each took to start serving first, so the
+eventlet and asyncio servers can be compared side by side.
+
+Needs the asyncio client: pip install "python-socketio[asyncio_client]"
+
+    python -m bench.load --rooms 1,10,50,100 --duration 20
+    python -m bench.load --runtime eventlet,asyncio
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import json
+from collections import defaultdict
+
+import socketio
+
+import delta
+from game import FACE_BY_VAL, card_payload
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Stats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.latency = defaultdict(list)
+        self.received = 0
+        self.games = 0
+        self.started = time.perf_counter()
+
+
+class Player:
+    def __init__(self, table, name):
+        self.table = table
+        self.name = name
+        self.stats = table.stats
+        self.rng = table.rng
+        self.view = None
+        self.version = 0
+        self.cards = []
+        self.sio = socketio.AsyncClient(reconnection=False)
+        for event in ("game_state", "hand", "bid_now", "play_now", "shoot_now", "give_shoot",
+                      "join_success", "join_redirect", "player_list", "winner"):
+            self.sio.on(event, self.counted(getattr(self, "on_" + event)))
+
+    def counted(self, handler):
+        async def wrapper(data=None):
+            self.stats.received += 1
+            handler(data)
+        return wrapper
+
+    def act(self, event, data=None):
+        # answer outside the receive loop so the ack can come back
+        asyncio.get_running_loop().create_task(self.call(event, data))
+
+    async def call(self, event, data):
+        began = time.perf_counter()
+        try:
+            await self.sio.call(event, data, timeout=30)
+        except socketio.exceptions.TimeoutError:
+            self.stats.latency["timeout"].append(30.0)
+            return
+        self.stats.latency[event].append(time.perf_counter() - began)
+
+    def hand(self):
+        return [FACE_BY_VAL[val] * 2 for val in self.cards]
+
+    def on_game_state(self, msg):
+        if "full" in msg:
+            self.view = msg["full"]
+        elif self.view is not None and msg["v"] == self.version + 1:
+            delta.apply(self.view, msg["patch"])
+        else:
+            self.act("resync")
+            return
+        self.version = msg["v"]
+
+    def on_hand(self, msg):
+        self.cards = msg["hand"]
+
+    def on_bid_now(self, prompt):
+        highest = prompt["highest"]
+        if prompt["mustBid"]:
+            self.act("player_bid", {"bid": 4, "suit": "♠"})
+        elif highest < 9 and self.rng.random() < 0.02:
+            self.act("player_bid", {"bid": 9, "suit": "Shoot"})
+        elif not prompt["alreadyShot"] and highest < 6 and self.rng.random() < 0.3:
+            self.act("player_bid", {"bid": max(highest, 3) + 1, "suit": self.rng.choice(["♦", "♥", "♣", "♠", "↑", "↓"])})
+        else:
+            self.act("player_bid", {"bid": 0, "suit": "Pass"})
+
+    def on_shoot_now(self, prompt):
+        first, second = prompt["teammates"]
+        rid = [card_payload(card) for card in self.hand()[:2]]
+        self.act("shoot_ans", {"trump": "♠", first: 1, second: 1, "rid": rid})
+
+    def on_give_shoot(self, _):
+        self.act("give_card", card_payload(self.hand()[0]))
+
+    def on_play_now(self, prompt):
+        cards = [card for card in self.hand() if prompt["legal"] >> (card >> 1) & 1]
+        self.act("play_card", card_payload(self.rng.choice(cards)))
+
+    def on_join_success(self, data):
+        self.table.code = data["room_code"]
+        self.table.joined.set()
+
+    def on_join_redirect(self, data):
+        async def move():
+            await self.sio.disconnect()
+            await self.sio.connect(data["url"], transports=["websocket"])
+            await self.sio.emit("join_room", {"room_code": data["room_code"], "username": self.name})
+        asyncio.get_running_loop().create_task(move())
+
+    def on_player_list(self, names):
+        if len(names) == 5 and not self.table.started:
+            self.table.started = True
+            self.act("start_game", names)
+
+    def on_winner(self, _):
+        if self.table.players[0] is self:
+            self.stats.games += 1
+            self.act("start_game", [p.name for p in self.table.players[1:]])
+
+
+class Table:
+    def __init__(self, index, stats):
+        self.stats = stats
+        self.rng = random.Random(index)
+        self.code = None
+        self.started = False
+        self.joined = asyncio.Event()
+        self.players = [Player(self, f"t{index}p{seat}") for seat in range(6)]
+
+    async def open(self, url):
+        host = self.players[0]
+        await host.sio.connect(url, transports=["websocket"])
+        await host.sio.emit("create_room", {"username": host.name})
+        await self.joined.wait()
+        for player in self.players[1:]:
+            await player.sio.connect(url, transports=["websocket"])
+            await player.sio.emit("join_room", {"room_code": self.code, "username": player.name})
+
+    async def close(self):
+        for player in self.players:
+            await player.sio.disconnect()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def proc_status(pid):
+    status = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                status[key] = value.split()[0] if value.split() else ""
+    except OSError:
+        pass
+    return status
+
+
+def server_stats(url):
+    try:
+        with urllib.request.urlopen(url + "/stats", timeout=10) as response:
+            return json.load(response)
+    except OSError:
+        return {}
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def report(count, stats, pid, url):
+    elapsed = time.perf_counter() - stats.started
+    latencies = [v for event, values in stats.latency.items() if event != "timeout" for v in values]
+    status = proc_status(pid) if pid else {}
+    server = server_stats(url)
+    print(f"{count:6d} rooms | rtt ms p50 {percentile(latencies, 50) * 1e3:7.1f} "
+          f"p95 {percentile(latencies, 95) * 1e3:7.1f} p99 {percentile(latencies, 99) * 1e3:7.1f} | "
+          f"{stats.received / elapsed:8.0f} events/s {len(latencies) / elapsed:7.0f} actions/s | "
+          f"timeouts {len(stats.latency['timeout'])} | games {stats.games} | "
+          f"rss {int(status.get('VmRSS', 0)) / 1024:7.1f} MiB threads {status.get('Threads', '?')} "
+          f"connections {server.get('connections', '?')} server rooms {server.get('rooms', '?')}", flush=True)
+    for event in sorted(stats.latency):
+        if event != "timeout":
+            values = stats.latency[event]
+            print(f"{'':14}{event:>12}: n={len(values):6d} p50 {percentile(values, 50) * 1e3:7.1f} "
+                  f"p99 {percentile(values, 99) * 1e3:7.1f} ms")
+
+
+async def ramp(url, steps, duration, pid):
+    stats = Stats()
+    tables = []
+    for count in steps:
+        while len(tables) < count:
+            table = Table(len(tables), stats)
+            await table.open(url)
+            tables.append(table)
+        stats.reset()
+        await asyncio.sleep(duration)
+        report(count, stats, pid, url)
+    for table in tables:
+        await table.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", default="1,5,10,25,50", help="comma separated ramp of table counts")
+    parser.add_argument("--duration", type=float, default=10, help="seconds measured per step")
+    parser.add_argument("--url", help="use a server that is already running")
+    parser.add_argument("--pid", type=int, help="pid of that server, for RSS and threads")
+    parser.add_argument("--trick-pause", default="0.05", help="TRICK_PAUSE for the spawned server")
+    parser.add_argument("--runtime", default="eventlet", help="comma separated RUNTIMEs for the spawned server")
+    args = parser.parse_args()
+    steps = [int(step) for step in args.rooms.split(",")]
+
+    if args.url:
+        asyncio.run(ramp(args.url, steps, args.duration, args.pid))
+        return
+    for runtime in args.runtime.split(","):
+        port = free_port()
+        # the clients answer at machine speed, far past a person's rate limit
+        env = dict(os.environ, PORT=str(port), TRICK_PAUSE=args.trick_pause, RUNTIME=runtime, RATE="1000", BURST="1000")
+        began = time.perf_counter()
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py")], env=env, cwd=ROOT,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        url = f"http://127.0.0.1:{port}"
+        try:
+            while not server_stats(url):
+                if server.poll() is not None or time.perf_counter() - began > 30:
+                    sys.exit(f"server.py (RUNTIME={runtime}) did not come up")
+                time.sleep(0.01)
+            print(f"RUNTIME={runtime}: serving after {time.perf_counter() - began:.2f} s", flush=True)
+            asyncio.run(ramp(url, steps, args.duration, server.pid))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Per-room overhead of idle tables.
+
+Compares the old model (one OS thread per room parked in Queue.get())
+with Game state machines waiting for a bid.
+
+    python -m bench.rooms --rooms 2000
+"""
+import argparse
+import gc
+import os
+import threading
+import time
+import tracemalloc
+from queue import Queue
+
+from game import Game
+
+
+def rss_kb():
+    with open(f"/proc/{os.getpid()}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def dealt_game():
+    game = Game([f"p{x}" for x in range(6)])
+    game.start()
+    return game
+
+
+def thread_model(n):
+    # same table state, plus the thread that used to sit on the bid queue
+    games = [dealt_game() for _ in range(n)]
+    queues = [Queue() for _ in range(n)]
+    threads = [threading.Thread(target=q.get, daemon=True) for q in queues]
+    for thread in threads:
+        thread.start()
+    return games, queues, threads
+
+
+def state_machine_model(n):
+    return [dealt_game() for _ in range(n)]
+
+
+def measure(label, build, n):
+    gc.collect()
+    rss = rss_kb()
+    tracemalloc.start()
+    began = time.perf_counter()
+    held = build(n)
+    elapsed = time.perf_counter() - began
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    grown = rss_kb() - rss
+    print(f"{label:>14}: {n} rooms, {threading.active_count() - 1} extra threads, "
+          f"{traced / n / 1024:.1f} KiB py heap/room, {grown / n:.1f} KiB rss/room, "
+          f"{elapsed / n * 1e6:.0f} us setup/room")
+    return held
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=1000)
+    args = parser.parse_args()
+
+    games = measure("state machine", state_machine_model, args.rooms)
+    _, queues, threads = measure("thread/room", thread_model, args.rooms)
+    for q in queues:
+        q.put(None)
+    for thread in threads:
+        thread.join()
+    del games
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Table-driven trick resolution vs the old get_winner.
+
+Times the same kind of tie-free tricks tests/test_tricks.py checks the
+strength tables on against bench/legacy.py: every card follows the
+(effective) led suit or is trump.
+
+    python -m bench.tricks
+"""
+import random
+import timeit
+
+import game
+from bench import legacy
+
+
+def legacy_card(card):
+    return legacy.Card(game.SUITS[game.CARD_SUIT[card]], game.RANKS[game.CARD_RANK[card]])
+
+
+def random_trick(rng, mode, size):
+    # distinct faces, each card either trump or following the led suit
+    effective = game.EFFECTIVE_SUIT[mode]
+    led = rng.randrange(4)
+    first = rng.choice([face for face in range(24) if effective[face] == led])
+    rest = [face for face in range(24) if effective[face] in (led, mode) and face != first]
+    faces = [first] + rng.sample(rest, min(size - 1, len(rest)))
+    return [face * 2 + rng.randrange(2) for face in faces]
+
+
+def main():
+    rng = random.Random(11)
+    tricks = [random_trick(rng, 0, 6) for _ in range(10000)]
+    old = [[legacy_card(card) for card in trick] for trick in tricks]
+    old_high = legacy.Bid(8, "diamonds")
+    high = game.Bid(8, "diamonds")
+
+    t_old = min(timeit.repeat(lambda: [legacy.get_winner(t, old_high) for t in old], number=1, repeat=5))
+    t_new = min(timeit.repeat(lambda: [game.get_winner(t, high) for t in tricks], number=1, repeat=5))
+    n = len(tricks)
+    print(f"old get_winner   {t_old / n * 1e6:6.2f} us/trick")
+    print(f"table get_winner {t_new / n * 1e6:6.2f} us/trick  {t_old / t_new:5.1f}x")
+    if game.numpy is not None:
+        batch = game.numpy.array(tricks, dtype=game.numpy.int8)
+        t_np = min(timeit.repeat(lambda: game.get_winners(batch, 0), number=1, repeat=5))
+        print(f"numpy batch      {t_np / n * 1e6:6.2f} us/trick  {t_old / t_np:5.1f}x")
+    else:
+        print("numpy not installed, skipping the batch timing")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Bytes per hand and encode time: JSON vs the compact wire format.
+
+Plays seeded self-play hands and, on every state change, builds the table
+and its game_state patch the way render() does, once as JSON and once
+compact, plus each seat's hand when it changed. Prompts (bid_now,
+play_now) are counted too. The table patch is encoded once and broadcast
+to the six seats and --spectators watchers; sizes are whole Socket.IO
+event packets as delivered.
+
+    python -m bench.wire --hands 200 --spectators 50
+"""
+import argparse
+import json
+import time
+
+import delta
+import wire
+from game import hand_vals
+from wire import table_view
+from sim import SimGame, SimplePolicy, play_game
+
+
+class Recorder(SimGame):
+    """Collects every packet a JSON and a compact room would be sent, with its number of recipients."""
+    watchers = 6  # seats plus spectators getting the table broadcast
+
+    def __init__(self, players, seed=None):
+        super().__init__(players, seed)
+        self.tables = {"json": None, "compact": None}
+        self.sent_hands = [None] * 6
+        self.packets = {"json": [], "compact": []}
+
+    def changed(self):
+        view = table_view(self)
+        for kind, table in (("json", view), ("compact", wire.compact_table(view))):
+            last = self.tables[kind]
+            self.tables[kind] = table
+            if last is None:
+                self.packets[kind].append(("game_state", {"v": 1, "full": table}, self.watchers))
+            else:
+                patch = delta.diff(last, table)
+                if patch:
+                    self.packets[kind].append(("game_state", {"v": 1, "patch": patch}, self.watchers))
+        for seat in range(6):
+            hand = hand_vals(self.hands[seat])
+            if hand != self.sent_hands[seat]:
+                self.sent_hands[seat] = hand
+                for kind in self.packets:
+                    self.packets[kind].append(("hand", {"seat": seat, "hand": hand}, 1))
+
+    def prompt(self, seat, event, data=None):
+        super().prompt(seat, event, data)
+        if event in ("bid_now", "play_now"):
+            for kind in self.packets:
+                self.packets[kind].append((event, data, 1))
+
+
+def encode_json(packets):
+    return [json.dumps([event, data], separators=(",", ":")).encode() for event, data, _ in packets]
+
+
+def encode_compact(packets):
+    return [json.dumps([event, wire.pack(event, data)], separators=(",", ":")).encode() for event, data, _ in packets]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hands", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spectators", type=int, default=0)
+    args = parser.parse_args()
+    Recorder.watchers = 6 + args.spectators
+
+    policies = [SimplePolicy()] * 6
+    packets = {"json": [], "compact": []}
+    hands = 0
+    seed = args.seed
+    while hands < args.hands:
+        game = play_game(policies, seed, args.hands - hands, Recorder)
+        hands += len(game.records)
+        for kind in packets:
+            packets[kind].extend(game.packets[kind])
+        seed += 1
+
+    for label, sent, encode in (("json", packets["json"], encode_json), ("compact", packets["compact"], encode_compact)):
+        encoded = encode(sent)
+        size = sum(len(packet) * recipients for packet, (_, _, recipients) in zip(encoded, sent))
+        delivered = sum(recipients for _, _, recipients in sent)
+        began = time.perf_counter()
+        for _ in range(5):
+            encode(sent)
+        elapsed = (time.perf_counter() - began) / 5
+        print(f"{label:>8}: {len(encoded) / hands:7.1f} encodes/hand {delivered / hands:8.1f} packets/hand "
+              f"{size / hands:9.0f} bytes/hand {elapsed / len(encoded) * 1e6:6.2f} us/packet encode")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Bot seats: answer prompts in-process, with a time-boxed search for plays.
+
+Bids, shoots and gives come from SimplePolicy's hand-strength tables. A
+play is a determinized search: deal the cards this seat can't see to the
+other seats at random (keeping every hand's size), play each legal card
+and then the rest of the hand out with the greedy rollout below, and
+keep the card that took the most tricks for our team over the samples.
+Rollouts from the start of a trick are memoized in a transposition cache
+keyed by the whole position, so a deal that comes up again (which is
+most of them late in a hand) is only played out once.
+
+search() takes a plain tuple from position() so it can run in a worker
+process. Bots runs it in worker processes for the server, which polls the
+future and falls back to SimplePolicy.play when the budget runs out.
+BotPolicy runs it in-process for sim.py:
+
+    python sim.py --games 200 --policy bots:BotPolicy --team2-policy sim:SimplePolicy
+"""
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from game import EFFECTIVE_SUIT, STRENGTH, SUIT_MASKS, sort_hand
+from sim import SimplePolicy
+
+BUDGET = 0.05
+SAMPLES = 32
+CACHE_SIZE = 1 << 17
+
+cache = {}  # (hands, leader, mode, skip) -> tricks each team takes from there
+
+
+def position(game, seat):
+    """What seat may know when it plays, as a tuple search() can be sent."""
+    hidden = 0
+    for other in range(6):
+        if other != seat:
+            hidden |= game.hands[other]
+    return (seat, game.hands[seat], hidden, tuple(hand.bit_count() for hand in game.hands), tuple(game.trick),
+            tuple(game.trick_seats), game.mode, tuple(game.skip))
+
+
+def winning(trick, mode):
+    table = STRENGTH[mode][EFFECTIVE_SUIT[mode][trick[0] >> 1]]
+    best = 0
+    for index in range(1, len(trick)):
+        if table[trick[index] >> 1] > table[trick[best] >> 1]:
+            best = index
+    return best
+
+
+def greedy(hand, trick, seats, seat, mode):
+    # SimplePolicy.play on bare masks: lead the strongest card, duck under a
+    # partner who is winning, otherwise win as cheaply as possible
+    if not trick:
+        return max(sort_hand(hand), key=lambda card: STRENGTH[mode][EFFECTIVE_SUIT[mode][card >> 1]][card >> 1])
+    led = EFFECTIVE_SUIT[mode][trick[0] >> 1]
+    table = STRENGTH[mode][led]
+    cards = sorted(sort_hand(hand & SUIT_MASKS[mode][led] or hand), key=lambda card: table[card >> 1])
+    best = winning(trick, mode)
+    if seats[best] % 2 == seat % 2:
+        return cards[0]
+    for card in cards:
+        if table[card >> 1] > table[trick[best] >> 1]:
+            return card
+    return cards[0]
+
+
+def finish_trick(hands, trick, seats, mode):
+    # play the rest of a trick in place; returns the winning seat
+    for seat in seats[len(trick):]:
+        card = greedy(hands[seat], trick, seats, seat, mode)
+        hands[seat] &= ~(1 << card)
+        trick.append(card)
+    return seats[winning(trick, mode)]
+
+
+def rollout(hands, leader, mode, skip):
+    """Tricks (team 1, team 2) left to take from a trick start, memoized."""
+    key = (tuple(hands), leader, mode, skip)
+    found = cache.get(key)
+    if found is not None:
+        return found
+    taken = [0, 0]
+    hands = list(hands)
+    while hands[leader]:
+        seats = [(leader + x) % 6 for x in range(6) if (leader + x) % 6 not in skip]
+        leader = finish_trick(hands, [], seats, mode)
+        taken[leader % 2] += 1
+    if len(cache) >= CACHE_SIZE:
+        cache.clear()
+    cache[key] = found = tuple(taken)
+    return found
+
+
+def search(state, samples=SAMPLES, seed=None, budget=BUDGET):
+    """The card to play: most tricks for seat's team over sampled deals."""
+    seat, hand, hidden, sizes, trick, seats, mode, skip = state
+    legal = sort_hand(hand & SUIT_MASKS[mode][EFFECTIVE_SUIT[mode][trick[0] >> 1]] or hand if trick else hand)
+    if len(legal) == 1:
+        return legal[0]
+    rng = random.Random(seed)
+    unseen = sort_hand(hidden)
+    scores = dict.fromkeys(legal, 0)
+    stop = time.perf_counter() + budget
+    for _ in range(samples):
+        rng.shuffle(unseen)
+        hands = []
+        dealt = 0
+        for other in range(6):
+            if other == seat:
+                hands.append(hand)
+            else:
+                mask = 0
+                for card in unseen[dealt:dealt + sizes[other]]:
+                    mask |= 1 << card
+                hands.append(mask)
+                dealt += sizes[other]
+        for card in legal:
+            after = list(hands)
+            after[seat] &= ~(1 << card)
+            winner = finish_trick(after, list(trick) + [card], seats, mode)
+            taken = rollout(after, winner, mode, skip)
+            scores[card] += taken[seat % 2] + (winner % 2 == seat % 2)
+        if time.perf_counter() >= stop:
+            break
+    return max(legal, key=scores.get)
+
+
+class BotPolicy(SimplePolicy):
+    """SimplePolicy with plays from search(), run in-process."""
+
+    def __init__(self, samples=SAMPLES, budget=BUDGET, seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.samples = samples
+        self.budget = budget
+        self.random = random.Random(seed)
+
+    def play(self, game, seat):
+        return search(position(game, seat), self.samples, self.random.getrandbits(32), self.budget)
+
+
+class Worker:
+    """One `python bots.py --worker` process, answering search() jobs in order."""
+
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker"],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        self.waiting = {}  # job id -> Future
+        threading.Thread(target=self.read, name="bot worker", daemon=True).start()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def send(self, job, future, args):
+        self.waiting[job] = future
+        self.process.stdin.write(json.dumps([job, *args]) + "\n")
+        self.process.stdin.flush()
+
+    def read(self):
+        for line in self.process.stdout:
+            job, card = json.loads(line)
+            future = self.waiting.pop(job, None)
+            if future and future.set_running_or_notify_cancel():
+                future.set_result(card)
+        for future in self.waiting.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("bot worker exited"))
+        self.waiting.clear()
+
+
+class Bots:
+    """search() for the server's bot seats, in worker processes.
+
+    Workers are fresh interpreters rather than forks, so they share none of
+    the server's sockets or green threads, and are started again if one
+    dies. A search stops itself after half the budget; the caller waits on
+    the Future for the rest and cancels it when it gives up.
+    """
+
+    def __init__(self, workers=1, samples=SAMPLES, budget=BUDGET):
+        self.size = workers
+        self.samples = samples
+        self.budget = budget
+        self.workers = []
+        self.jobs = itertools.count()
+
+    def submit(self, game, seat):
+        self.workers = [worker for worker in self.workers if worker.alive()]
+        while len(self.workers) < self.size:
+            self.workers.append(Worker())
+        worker = min(self.workers, key=lambda worker: len(worker.waiting))
+        future = Future()
+        # search for half the budget; the round trip takes a few ms more
+        worker.send(next(self.jobs), future, (position(game, seat), self.samples, random.getrandbits(32), self.budget / 2))
+        return future
+
+    def close(self):
+        for worker in self.workers:
+            worker.process.stdin.close()
+            worker.process.wait()
+        self.workers = []
+
+
+def work():
+    # --worker: one job per line on stdin, [job, card] per line on stdout
+    for line in sys.stdin:
+        job, state, samples, seed, budget = json.loads(line)
+        seat, hand, hidden, sizes, trick, seats, mode, skip = state
+        card = search((seat, hand, hidden, tuple(sizes), tuple(trick), tuple(seats), mode, tuple(skip)), samples, seed, budget)
+        sys.stdout.write(json.dumps([job, card]) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["--worker"]:
+    work()
@@ -0,0 +1,114 @@
+"""Split templates/index.html into hashed static files, pre-compressed.
+
+The inline <style> and <script> blocks become app.<hash>.css and
+app.<hash>.js, and the page links to them under /assets/, so they can be
+cached forever and a new build gets new names. Every file is also written
+gzipped (.gz) and, if the brotli package is installed, as .br.
+
+    python build.py            # writes dist/, run at deploy time
+
+server.py serves dist/ when it was built from the current template and
+otherwise builds the same thing in memory at startup, so an edit to
+templates/index.html is never hidden behind a stale dist/.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(ROOT, "templates", "index.html")
+DIST = os.path.join(ROOT, "dist")
+
+TYPES = {".html": "text/html; charset=utf-8", ".css": "text/css; charset=utf-8", ".js": "text/javascript; charset=utf-8"}
+INLINE = {
+    ".css": (re.compile(r"<style>(.*?)</style>", re.S), '<link rel="stylesheet" href="/assets/{}">'),
+    ".js": (re.compile(r"<script>(.*?)</script>", re.S), '<script src="/assets/{}"></script>'),
+}
+
+
+class Asset:
+    def __init__(self, name, body):
+        self.name = name
+        self.type = TYPES[os.path.splitext(name)[1]]
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {"identity": body}
+
+    def compress(self):
+        body = self.variants["identity"]
+        self.variants["gzip"] = gzip.compress(body, 9, mtime=0)
+        if brotli:
+            self.variants["br"] = brotli.compress(body, quality=11)
+        return self
+
+
+def source_hash(source=SOURCE):
+    with open(source, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build(source=SOURCE):
+    """Return {name: Asset}; "index.html" links to the hashed css and js."""
+    with open(source, encoding="utf-8") as f:
+        page = f.read()
+    assets = {}
+    for ext, (pattern, tag) in INLINE.items():
+        blocks = pattern.findall(page)
+        if not blocks:
+            continue
+        body = "\n".join(block.strip("\n") for block in blocks).encode()
+        name = f"app.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+        assets[name] = Asset(name, body).compress()
+        links = iter([tag.format(name)])  # the first block becomes the link, the rest go
+        page = pattern.sub(lambda _: next(links, ""), page)
+    assets["index.html"] = Asset("index.html", page.encode()).compress()
+    return assets
+
+
+def write(assets, out=DIST, source=SOURCE):
+    os.makedirs(out, exist_ok=True)
+    for asset in assets.values():
+        for encoding, body in asset.variants.items():
+            suffix = {"identity": "", "gzip": ".gz", "br": ".br"}[encoding]
+            with open(os.path.join(out, asset.name + suffix), "wb") as f:
+                f.write(body)
+    with open(os.path.join(out, "manifest.json"), "w") as f:
+        json.dump({"source": source_hash(source), "assets": sorted(assets)}, f)
+
+
+def load(out=DIST, source=SOURCE):
+    """Read a build written by write(), or None if there isn't one of this source."""
+    try:
+        with open(os.path.join(out, "manifest.json")) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if not isinstance(manifest, dict) or manifest["source"] != source_hash(source):
+        return None
+    names = manifest["assets"]
+    assets = {}
+    for name in names:
+        with open(os.path.join(out, name), "rb") as f:
+            asset = Asset(name, f.read())
+        for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+            path = os.path.join(out, name + suffix)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    asset.variants[encoding] = f.read()
+        assets[name] = asset
+    return assets
+
+
+if __name__ == "__main__":
+    built = build()
+    write(built, sys.argv[1] if len(sys.argv) > 1 else DIST)
+    for asset in built.values():
+        sizes = ", ".join(f"{encoding} {len(body)}" for encoding, body in asset.variants.items())
+        print(f"{asset.name}: {sizes}")
@@ -0,0 +1,47 @@
+"""Patches between two game_state views.
+
+A patch mirrors the dict it applies to. For each changed key it holds one of
+    {"=": value}        replace the value
+    {"+": [items]}      append to a list (e.g. a new score row)
+    {"@": {i: value}}   overwrite list slots (e.g. one seat's play)
+    {...}               a nested patch for a dict value
+Keys that did not change are left out, so an empty patch means no change.
+"""
+
+
+def diff(old, new):
+    patch = {}
+    for key, value in new.items():
+        before = old.get(key)
+        if before == value:
+            continue
+        if isinstance(value, dict) and isinstance(before, dict):
+            patch[key] = diff(before, value)
+        elif isinstance(value, list) and isinstance(before, list):
+            if len(value) > len(before) and value[:len(before)] == before:
+                patch[key] = {"+": value[len(before):]}
+            elif len(value) == len(before):
+                changed = {i: v for i, v in enumerate(value) if before[i] != v}
+                if len(changed) < len(value):
+                    patch[key] = {"@": changed}
+                else:
+                    patch[key] = {"=": value}
+            else:
+                patch[key] = {"=": value}
+        else:
+            patch[key] = {"=": value}
+    return patch
+
+
+def apply(view, patch):
+    for key, change in patch.items():
+        if "=" in change:
+            view[key] = change["="]
+        elif "+" in change:
+            view[key].extend(change["+"])
+        elif "@" in change:
+            for i, value in change["@"].items():
+                view[key][int(i)] = value
+        else:
+            apply(view[key], change)
+    return view
@@ -0,0 +1,555 @@
+import random
+
+try:
+    import numpy
+except ImportError:  # only needed for batched get_winners
+    numpy = None
+
+# A card is an int 0-47: (suit * 6 + rank) * 2 + copy, where copy tells the
+# two decks apart. card >> 1 is the face (0-23) and a hand is a bitmask of
+# card ids, so ascending bit order is already the sorted hand.
+SUITS = ["diamonds", "hearts", "clubs", "spades"]
+RANKS = ["9", "10", "jack", "queen", "king", "ace"]
+SUIT_SYMBOLS = ["♦", "♥", "♣", "♠"]
+RANK_SYMBOLS = ["9", "10", "J", "Q", "K", "A"]
+
+CARD_SUIT = [(card >> 1) // 6 for card in range(48)]
+CARD_RANK = [(card >> 1) % 6 for card in range(48)]
+CARD_VALS = [RANK_SYMBOLS[CARD_RANK[card]] + SUIT_SYMBOLS[CARD_SUIT[card]] for card in range(48)]
+FACE_BY_VAL = {CARD_VALS[face * 2]: face for face in range(24)}
+JACK = RANKS.index("jack")
+
+# card ids and vals for every byte of a hand mask, so walking a hand is six
+# table lookups instead of a loop over bits
+BYTE_CARDS = [[tuple(chunk * 8 + bit for bit in range(8) if byte >> bit & 1) for byte in range(256)] for chunk in range(6)]
+BYTE_VALS = [[tuple(CARD_VALS[card] for card in cards) for cards in chunk] for chunk in BYTE_CARDS]
+
+
+def card_id(suit, rank, copy=0):
+    return (SUITS.index(suit) * 6 + RANKS.index(rank)) * 2 + copy
+
+
+class Deck():
+    def __init__(self, seed=None):
+        self.deck = []
+        self.random = random.Random(seed)
+
+    def initialize_deck(self):
+        self.deck = list(range(48))
+        return self
+
+    def shuffle_deck(self):
+        self.random.shuffle(self.deck)
+        return self
+
+    def draw_card(self):
+        return self.deck.pop()
+
+    def deal(self, players=6, cards=8):
+        hands = [0] * players
+        for i in range(players * cards):
+            hands[i // cards] |= 1 << self.draw_card()
+        return hands
+
+
+class Bid():
+    def __init__(self, bid, suit):
+        self.bid = bid
+        self.suit = suit
+
+
+def gen_card(val):
+    # "10♥" -> face id, the copy is picked by find_card against a hand
+    return FACE_BY_VAL.get(val[:-1].upper() + val[-1:])
+
+def find_card(hand, data):
+    # socket payload {"rank": "10", "suit": "♥"} -> id of a copy held in hand
+    face = gen_card(f"{data['rank']}{data['suit']}")
+    if face is None:
+        return None
+    for card in (face * 2, face * 2 + 1):
+        if hand >> card & 1:
+            return card
+    return None
+
+def sort_hand(hand):
+    cards = []
+    for chunk in range(6):
+        cards += BYTE_CARDS[chunk][hand >> (chunk * 8) & 255]
+    return cards
+
+def sort_hands(hands):
+    return [sort_hand(hand) for hand in hands]
+
+def hand_vals(hand):
+    vals = []
+    for chunk in range(6):
+        vals += BYTE_VALS[chunk][hand >> (chunk * 8) & 255]
+    return vals
+
+# Trump modes are the four suits, then "high" (no trump, ace high) and "low"
+# (no trump, nine high). For each mode EFFECTIVE_SUIT[mode][face] is the suit
+# a face follows (the left bower counts as trump) and
+# STRENGTH[mode][led][face] ranks every face against a led suit: 0 for an
+# off-suit card that can't win, then the led suit, then trump from the nine
+# up to the right bower. A trick is won by the first card with the highest
+# strength.
+MODES = SUITS + ["high", "low"]
+MODE_INDEX = {mode: index for index, mode in enumerate(MODES)}
+TRUMP_ORDER = [0, 1, 6, 2, 3, 4]  # 9 10 J Q K A, the jack being the right bower
+
+
+def build_tables():
+    effective = []
+    strength = []
+    for mode in range(6):
+        suits = []
+        for face in range(24):
+            suit, rank = face // 6, face % 6
+            if mode < 4 and rank == JACK and suit == mode ^ 1:
+                suit = mode
+            suits.append(suit)
+        by_led = []
+        for led in range(4):
+            row = []
+            for face in range(24):
+                suit, rank = suits[face], face % 6
+                if mode < 4 and suit == mode:
+                    # left bower sits between the ace and the right bower
+                    row.append(20 + (5 if face // 6 != mode else TRUMP_ORDER[rank]))
+                elif suit != led:
+                    row.append(0)
+                elif mode == 5:
+                    row.append(6 - rank)
+                else:
+                    row.append(1 + rank)
+            by_led.append(row)
+        effective.append(suits)
+        strength.append(by_led)
+    return effective, strength
+
+
+EFFECTIVE_SUIT, STRENGTH = build_tables()
+
+
+def get_winner(plays, high):
+    mode = MODE_INDEX[high.suit.lower()]
+    table = STRENGTH[mode][EFFECTIVE_SUIT[mode][plays[0] >> 1]]
+    high_index = 0
+    highest = table[plays[0] >> 1]
+    for index in range(1, len(plays)):
+        strength = table[plays[index] >> 1]
+        if strength > highest:
+            highest = strength
+            high_index = index
+    return high_index
+
+def get_winners(tricks, modes):
+    """Winning index for each trick in a batch.
+
+    tricks is an (n, k) array of card ids in play order and modes a mode
+    index, or one per trick. Uses NumPy when it is installed.
+    """
+    if numpy is None:
+        if isinstance(modes, int):
+            modes = [modes] * len(tricks)
+        return [get_winner(trick, Bid(0, MODES[mode])) for trick, mode in zip(tricks, modes)]
+    faces = numpy.asarray(tricks) >> 1
+    modes = numpy.broadcast_to(numpy.asarray(modes), faces.shape[:1])
+    led = EFFECTIVE_SUIT_ARRAY[modes, faces[:, 0]]
+    return STRENGTH_ARRAY[modes[:, None], led[:, None], faces].argmax(axis=1)
+
+
+if numpy is not None:
+    EFFECTIVE_SUIT_ARRAY = numpy.array(EFFECTIVE_SUIT, dtype=numpy.int8)
+    STRENGTH_ARRAY = numpy.array(STRENGTH, dtype=numpy.int8)
+
+
+BID_SUITS = {"♦": "diamonds", "♥": "hearts", "♣": "clubs", "♠": "spades", "↓": "low", "↑": "high", "Pass": "pass", "Shoot": "shoot", "Double Shoot": "shoot", "Triple Shoot": "shoot"}
+SHOOT_SUITS = {"♠": "spades", "♣": "clubs", "♥": "hearts", "♦": "diamonds", "↑": "high", "↓": "low"}
+MODE_SYMBOLS = SUIT_SYMBOLS + ["↑", "↓"]
+SHOOTS = ["Shoot", "Double Shoot", "Triple Shoot"]
+TRICK_PAUSE = 3
+
+# SUIT_MASKS[mode][suit]: every card id that follows suit under that mode
+SUIT_MASKS = [[sum(1 << card for card in range(48) if EFFECTIVE_SUIT[mode][card >> 1] == suit) for suit in range(4)] for mode in range(6)]
+
+
+def card_payload(card):
+    return {"rank": RANK_SYMBOLS[CARD_RANK[card]], "suit": SUIT_SYMBOLS[CARD_SUIT[card]]}
+
+def face_mask(hand):
+    # bit f is set when a copy of face f is in hand: 24 bits instead of 48
+    faces = 0
+    for card in sort_hand(hand):
+        faces |= 1 << (card >> 1)
+    return faces
+
+
+class Game:
+    """One table's game, advanced by player inputs instead of a blocking loop.
+
+    The socket layer (or a simulator) subclasses this and overrides
+    prompt/changed/finished/hand_over/later. bid/shoot/give/play take socket
+    payloads, the *_card methods take card ids. Inputs that are not expected
+    right now (wrong phase, wrong seat, card not held) are ignored and
+    return False.
+    """
+
+    trick_pause = TRICK_PAUSE
+
+    def __init__(self, players, seed=None):
+        self.players = list(players)
+        self.random = random.Random(seed)
+        self.scores = {"Team_1": [0], "Team_2": [0]}
+        self.totals = [0, 0]
+        self.begin = 0
+        self.phase = "waiting"
+        self.turn = None
+        self.reset_hand()
+
+    # saved state
+    STATE = ("players", "scores", "totals", "begin", "phase", "turn", "seed", "hands", "dealt",
+             "plays", "bids", "tricks", "highest", "bidder", "mode", "already_shot", "gives",
+             "rid", "given", "skip", "trick_seats", "trick", "trick_winners")
+
+    def to_dict(self):
+        # copies, since the state may be serialized while the game moves on
+        state = {}
+        for key in self.STATE:
+            value = getattr(self, key)
+            if isinstance(value, (list, tuple)):
+                value = list(value)
+            elif isinstance(value, dict):
+                value = {k: list(v) if isinstance(v, list) else v for k, v in value.items()}
+            state[key] = value
+        state["bid_list"] = [[bid.bid, bid.suit] for bid in self.bid_list]
+        state["high"] = [self.high.bid, self.high.suit] if self.high else None
+        return state
+
+    @classmethod
+    def from_dict(cls, state, *args):
+        """Rebuild a game saved with to_dict; args are the constructor's."""
+        game = cls(*args)
+        for key in cls.STATE:
+            setattr(game, key, state[key])
+        game.skip = tuple(game.skip)
+        game.bid_list = [Bid(*bid) for bid in state["bid_list"]]
+        game.high = Bid(*state["high"]) if state["high"] else None
+        return game
+
+    def reprompt(self):
+        # ask whoever we are waiting on again (after a restart or a rejoin)
+        if self.phase == "bidding":
+            self.ask_bid()
+        elif self.phase == "shoot":
+            self.ask_shoot()
+        elif self.phase == "give":
+            self.ask_give()
+        elif self.phase == "playing":
+            self.ask_play()
+
+    # hooks
+    def prompt(self, seat, event, data=None):
+        pass
+
+    def changed(self):
+        pass
+
+    def finished(self, winner):
+        pass
+
+    def hand_over(self, record):
+        pass
+
+    def later(self, delay, fn):
+        fn()
+
+    def reset_hand(self):
+        self.seed = None
+        self.hands = [0, 0, 0, 0, 0, 0]
+        self.dealt = [0, 0, 0, 0, 0, 0]
+        self.plays = [None, None, None, None, None, None]
+        self.bids = ["", "", "", "", "", ""]
+        self.tricks = {"Team_1": 0, "Team_2": 0}
+        self.bid_list = []
+        self.high = None
+        self.mode = None
+        self.bidder = None
+        self.highest = 0
+        self.already_shot = False
+        self.gives = []
+        self.rid = []
+        self.given = []
+        self.skip = ()
+        self.trick_seats = []
+        self.trick = []
+        self.trick_winners = []
+
+    def start(self):
+        self.deal()
+
+    def deal(self, seed=None):
+        self.reset_hand()
+        self.seed = self.random.getrandbits(32) if seed is None else seed
+        self.hands = Deck(self.seed).initialize_deck().shuffle_deck().deal()
+        self.dealt = list(self.hands)
+        self.changed()
+        self.phase = "bidding"
+        self.ask_bid()
+
+    # bidding
+    def must_bid(self):
+        return len(self.bid_list) == 5 and self.highest < 4
+
+    def ask_bid(self):
+        self.turn = (len(self.bid_list) + self.begin) % 6
+        self.prompt(self.turn, "bid_now", {"highest": self.highest, "alreadyShot": self.already_shot, "mustBid": self.must_bid()})
+
+    def bid(self, seat, data):
+        suit = BID_SUITS.get(data.get("suit"))
+        if suit is None or not isinstance(data.get("bid"), int):
+            return False
+        return self.place_bid(seat, data["bid"], suit)
+
+    def place_bid(self, seat, value, suit):
+        if self.phase != "bidding" or seat != self.turn:
+            return False
+        if value == 0 and self.must_bid() or value != 0 and (value <= self.highest or value > 11):
+            return False
+        if value > 8:
+            suit = "shoot"
+        elif value == 0:
+            suit = "pass"
+        elif suit not in MODE_INDEX:
+            return False
+        self.highest = max(self.highest, value)
+        if value > 8:
+            self.already_shot = True
+        self.bid_list.append(Bid(value, suit))
+        if value > 8:
+            self.bids[seat] = SHOOTS[value - 9]
+        elif value == 0:
+            self.bids[seat] = "Pass"
+        else:
+            self.bids[seat] = f"{value} {MODE_SYMBOLS[MODE_INDEX[suit]]}"
+        self.changed()
+        if len(self.bid_list) < 6:
+            self.ask_bid()
+        else:
+            self.end_bidding()
+        return True
+
+    def end_bidding(self):
+        highest_bid = 0
+        for bid in self.bid_list:
+            if bid.bid > highest_bid:
+                highest_bid = bid.bid
+                self.high = bid
+        self.bidder = (self.bid_list.index(self.high) + self.begin) % 6
+        self.bids = ["" if x != self.bidder else self.bids[x] for x in range(6)]
+        self.changed()
+        if self.high.bid > 8:
+            self.phase = "shoot"
+            self.turn = self.bidder
+            self.ask_shoot()
+        else:
+            self.mode = MODE_INDEX[self.high.suit]
+            self.start_tricks()
+
+    # shooting
+    def ask_shoot(self):
+        team_1 = self.players[(self.bidder + 2) % 6]
+        team_2 = self.players[(self.bidder + 4) % 6]
+        self.prompt(self.bidder, "shoot_now", {"teammates": [team_1, team_2]})
+
+    def shoot(self, seat, answer):
+        if seat is None or answer.get("trump") not in SHOOT_SUITS:
+            return False
+        team_1 = self.players[(seat + 2) % 6]
+        team_2 = self.players[(seat + 4) % 6]
+        takes = (answer.get(team_1), answer.get(team_2))
+        if not all(isinstance(take, int) for take in takes):
+            return False
+        hand = self.hands[seat]
+        rid = []
+        for data in answer.get("rid") or []:
+            card = find_card(hand, data)
+            if card is None:
+                return False
+            hand &= ~(1 << card)
+            rid.append(card)
+        return self.shoot_cards(seat, MODE_INDEX[SHOOT_SUITS[answer["trump"]]], takes, rid)
+
+    def shoot_cards(self, seat, mode, takes, rid):
+        if self.phase != "shoot" or seat != self.turn:
+            return False
+        if min(takes) < 0 or sum(takes) > 2 or len(rid) != sum(takes):
+            return False
+        hand = self.hands[seat]
+        for card in rid:
+            if not hand >> card & 1:
+                return False
+            hand &= ~(1 << card)
+        self.hands[seat] = hand
+        self.rid = list(rid)
+        team_1 = (seat + 2) % 6
+        team_2 = (seat + 4) % 6
+        self.mode = mode
+        self.high = Bid(self.high.bid, MODES[mode])
+        self.bids[seat] = MODE_SYMBOLS[mode]
+        self.bids[team_1] = takes[0]
+        self.bids[team_2] = takes[1]
+        self.gives = [team_1] * takes[0] + [team_2] * takes[1]
+        self.changed()
+        self.phase = "give"
+        self.ask_give()
+        return True
+
+    def ask_give(self):
+        if not self.gives:
+            self.bids = ["" if x != self.bidder else self.bids[x] for x in range(6)]
+            self.changed()
+            self.start_tricks()
+            return
+        self.turn = self.gives[0]
+        self.prompt(self.turn, "give_shoot")
+
+    def give(self, seat, data):
+        card = find_card(self.hands[seat], data) if seat is not None else None
+        return card is not None and self.give_card(seat, card)
+
+    def give_card(self, seat, card):
+        if self.phase != "give" or seat != self.turn or not self.hands[seat] >> card & 1:
+            return False
+        self.gives.pop(0)
+        self.given.append(card)
+        self.hands[seat] &= ~(1 << card)
+        self.hands[self.bidder] |= 1 << card
+        self.changed()
+        self.ask_give()
+        return True
+
+    # trick play
+    def start_tricks(self):
+        if self.high.bid > 8:
+            self.skip = ((self.bidder + 2) % 6, (self.bidder + 4) % 6)
+        self.phase = "playing"
+        self.start_trick(self.bidder)
+
+    def start_trick(self, leader):
+        self.trick_seats = [(leader + x) % 6 for x in range(6)]
+        self.trick_seats = [seat for seat in self.trick_seats if seat not in self.skip]
+        self.trick = []
+        self.ask_play()
+
+    def ask_play(self):
+        self.turn = self.trick_seats[len(self.trick)]
+        x = (self.turn - self.trick_seats[0]) % 6
+        first = card_payload(self.trick[0]) if self.trick else None
+        self.prompt(self.turn, "play_now", {"x": x, "high": {"bid": self.high.bid, "suit": self.high.suit}, "first": first,
+                                            "legal": face_mask(self.legal_cards(self.turn))})
+
+    def legal_cards(self, seat):
+        # follow the led suit (by effective suit, so the left bower is trump) if possible
+        hand = self.hands[seat]
+        if not self.trick:
+            return hand
+        follow = hand & SUIT_MASKS[self.mode][EFFECTIVE_SUIT[self.mode][self.trick[0] >> 1]]
+        return follow or hand
+
+    def play(self, seat, data):
+        card = find_card(self.hands[seat], data) if seat is not None else None
+        return card is not None and self.play_card(seat, card)
+
+    def play_card(self, seat, card):
+        if self.phase != "playing" or seat != self.turn or not self.legal_cards(seat) >> card & 1:
+            return False
+        self.hands[seat] &= ~(1 << card)
+        self.trick.append(card)
+        self.plays[seat] = card
+        self.changed()
+        if len(self.trick) < len(self.trick_seats):
+            self.ask_play()
+        else:
+            self.phase = "pause"
+            self.turn = None
+            self.later(self.trick_pause, self.end_trick)
+        return True
+
+    def end_trick(self):
+        winner = self.trick_seats[get_winner(self.trick, self.high)]
+        self.trick_winners.append(winner)
+        self.tricks["Team_1" if winner % 2 == 0 else "Team_2"] += 1
+        self.plays = [None, None, None, None, None, None]
+        self.changed()
+        if self.tricks["Team_1"] + self.tricks["Team_2"] != 8:
+            self.phase = "playing"
+            self.start_trick(winner)
+        else:
+            self.end_hand()
+
+    # scoring
+    def end_hand(self):
+        team_1, team_2 = self.totals
+        team_1_t = self.tricks["Team_1"]
+        team_2_t = self.tricks["Team_2"]
+        bid = self.high.bid
+        if bid > 8:
+            points = 16 * (bid - 8) if bid < 11 else 64
+            if self.bidder % 2 == 0:
+                if team_1_t == 8:
+                    team_1 += points
+                else:
+                    team_1 -= points
+                    team_2 += team_2_t
+            else:
+                if team_2_t == 8:
+                    team_2 += points
+                else:
+                    team_2 -= points
+                    team_1 += team_1_t
+        else:
+            if self.bidder % 2 == 0:
+                if team_1_t < bid:
+                    team_1 -= bid
+                    team_2 += team_2_t
+                else:
+                    team_1 += team_1_t
+                    team_2 += team_2_t
+            else:
+                if team_2_t < bid:
+                    team_2 -= bid
+                    team_1 += team_1_t
+                else:
+                    team_2 += team_2_t
+                    team_1 += team_1_t
+        self.hand_over({
+            "seed": self.seed,
+            "begin": self.begin % 6,
+            "dealt": self.dealt,
+            "bids": [bid.bid for bid in self.bid_list],
+            "bidder": self.bidder,
+            "bid": bid,
+            "trump": self.mode,
+            "rid": self.rid,
+            "given": self.given,
+            "winners": self.trick_winners,
+            "tricks": [team_1_t, team_2_t],
+            "points": [team_1 - self.totals[0], team_2 - self.totals[1]],
+            "totals": [team_1, team_2],
+        })
+        self.totals = [team_1, team_2]
+        self.scores["Team_1"].append(team_1)
+        self.scores["Team_2"].append(team_2)
+        self.reset_hand()
+        self.changed()
+        self.begin += 1
+        if team_1 >= 52 or team_2 >= 52 or abs(team_2 - team_1) > 100:
+            if team_1 != team_2:
+                self.phase = "over"
+                self.turn = None
+                self.scores = {"Team_1": [0], "Team_2": [0]}
+                self.finished("Team 1" if team_1 > team_2 else "Team 2")
+                return
+        self.deal()
@@ -0,0 +1,243 @@
+"""Every finished hand, stored by column, for replays and stats.
+
+A hand holds the game id and hand number, the deal (seed, first bidder and
+the six dealt hand masks), the bids in bidding order, the winning bid and
+trump, the shoot discards and gives, the eight trick winners and the
+resulting tricks, points and totals. Short lists are padded with -1.
+
+Hands are appended to segment directories hands.<n>/ of SEGMENT_HANDS
+hands each, with one file per field (bid.col, tricks.col, ...) holding
+that field for every hand as a flat little-endian array. A scan maps only
+the columns it asks for: make_rate() reads bid, bidder and tricks, 4 of
+the 95 bytes a hand takes, and replay() reads the game column and then
+just the matching hands from the rest. Readers map the columns as numpy
+arrays, so a scan over millions of hands is a few vectorised passes per
+segment; without numpy the same queries fall back to struct.iter_unpack
+over the mapped files.
+
+    history = History("history")
+    history.append(record)         # a Game.hand_over record plus "game" and "hand"
+    history.replay(game_id)        # that game's records, in hand order
+    history.make_rate()            # {bid: (made, played)}
+    history.shoot_success()        # (made, played) over shoots
+
+    python history.py hands/                 # make rates by bid level
+    python history.py hands/ --game 123      # one game's hands as JSON lines
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+
+try:
+    import numpy
+except ImportError:  # pure Python scans
+    numpy = None
+
+SEGMENT_HANDS = 1 << 16
+SEGMENT = re.compile(r"hands\.(\d+)$")
+
+# name, struct code, count (1 for scalars)
+FIELDS = (
+    ("game", "Q", 1), ("hand", "H", 1), ("seed", "I", 1), ("begin", "B", 1),
+    ("dealt", "Q", 6), ("bids", "b", 6), ("bidder", "B", 1), ("bid", "B", 1),
+    ("trump", "B", 1), ("rid", "b", 2), ("given", "b", 2), ("winners", "b", 8),
+    ("tricks", "B", 2), ("points", "h", 2), ("totals", "h", 2),
+)
+PADDED = {"rid", "given", "winners"}
+COLUMNS = {name: struct.Struct(f"<{count}{code}") for name, code, count in FIELDS}
+
+if numpy is not None:
+    DTYPES = {name: (numpy.dtype(code).newbyteorder("<"), count) for name, code, count in FIELDS}
+
+
+def pack(record):
+    """{field: bytes} for one hand, each the next entry of that field's column."""
+    packed = {}
+    for name, _, count in FIELDS:
+        value = record[name]
+        if count == 1:
+            packed[name] = COLUMNS[name].pack(value)
+        else:
+            packed[name] = COLUMNS[name].pack(*value, *[-1] * (count - len(value)))
+    return packed
+
+
+def unpack(values):
+    # values: {field: that field's values for one hand}
+    record = {}
+    for name, _, count in FIELDS:
+        items = [int(value) for value in values[name]]
+        if count == 1:
+            record[name] = items[0]
+        else:
+            record[name] = [value for value in items if value >= 0] if name in PADDED else items
+    return record
+
+
+def made(bid, bidder, tricks):
+    # tricks is the (team 1, team 2) pair; a shoot has to take all eight
+    return tricks[bidder % 2] >= min(bid, 8)
+
+
+class History:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        numbers = self.numbers()
+        self.segment = numbers[-1] if numbers else 0
+        self.rows = self.count(self.segment) if numbers else SEGMENT_HANDS
+        self.files = None  # field -> open column of the segment being written
+
+    def numbers(self):
+        return sorted(int(match[1]) for match in map(SEGMENT.match, os.listdir(self.path)) if match)
+
+    def name(self, number, field=None):
+        folder = os.path.join(self.path, f"hands.{number:06d}")
+        return folder if field is None else os.path.join(folder, f"{field}.col")
+
+    def count(self, number):
+        # hands every column has in full (a crash mid-append leaves some columns a hand longer)
+        try:
+            return min(os.path.getsize(self.name(number, field)) // column.size for field, column in COLUMNS.items())
+        except FileNotFoundError:
+            return 0
+
+    def append(self, record):
+        if self.rows >= SEGMENT_HANDS:
+            self.close()
+            self.segment += 1
+            self.rows = 0
+            os.makedirs(self.name(self.segment))
+            self.files = {field: open(self.name(self.segment, field), "wb") for field in COLUMNS}
+        elif self.files is None:
+            self.files = {}
+            for field, column in COLUMNS.items():
+                f = self.files[field] = open(self.name(self.segment, field), "ab")
+                f.truncate(self.rows * column.size)
+        for field, data in pack(record).items():
+            self.files[field].write(data)
+        for f in self.files.values():
+            f.flush()
+        self.rows += 1
+
+    def close(self):
+        if self.files:
+            for f in self.files.values():
+                f.close()
+            self.files = None
+
+    # reading
+    def segments(self, *fields):
+        """Yield {field: numpy array mapped from its column} per segment, for just these fields."""
+        for number in self.numbers():
+            rows = self.count(number)
+            if rows:
+                yield {field: self.column(number, field, rows) for field in fields}
+
+    def column(self, number, field, rows):
+        dtype, count = DTYPES[field]
+        return numpy.memmap(self.name(number, field), dtype, "r", 0, (rows,) if count == 1 else (rows, count))
+
+    def tuples(self, number, rows, *fields):
+        # one segment's columns without numpy: per hand, a tuple of values per field
+        if not rows:
+            return
+        files, maps, views = [], [], []
+        try:
+            for field in fields:
+                files.append(open(self.name(number, field), "rb"))
+                maps.append(mmap.mmap(files[-1].fileno(), 0, access=mmap.ACCESS_READ))
+                views.append(memoryview(maps[-1])[:rows * COLUMNS[field].size])
+            yield from zip(*(COLUMNS[field].iter_unpack(view) for field, view in zip(fields, views)))
+        finally:
+            for view in views:
+                view.release()
+            for data in maps:
+                data.close()
+            for f in files:
+                f.close()
+
+    def __len__(self):
+        return sum(self.count(number) for number in self.numbers())
+
+    def replay(self, game):
+        """Every recorded hand of one game, as hand_over records in hand order."""
+        found = []
+        for number in self.numbers():
+            rows = self.count(number)
+            if not rows:
+                continue
+            if numpy is None:
+                hits = [index for index, ((found,),) in enumerate(self.tuples(number, rows, "game")) if found == game]
+            else:
+                hits = numpy.flatnonzero(self.column(number, "game", rows) == game).tolist()
+            if hits:
+                found.extend(self.read(number, hits))
+        return sorted(found, key=lambda record: record["hand"])
+
+    def read(self, number, indexes):
+        # whole records for a few hands of one segment, one seek per field and hand
+        values = [{} for _ in indexes]
+        for field, column in COLUMNS.items():
+            with open(self.name(number, field), "rb") as f:
+                for found, index in zip(values, indexes):
+                    f.seek(index * column.size)
+                    found[field] = column.unpack(f.read(column.size))
+        return [unpack(found) for found in values]
+
+    def make_rate(self):
+        """{bid: (made, played)}; 9 to 11 are the shoot levels."""
+        totals = {}
+        if numpy is None:
+            for number in self.numbers():
+                for (bid,), (bidder,), tricks in self.tuples(number, self.count(number), "bid", "bidder", "tricks"):
+                    stats = totals.setdefault(bid, [0, 0])
+                    stats[0] += made(bid, bidder, tricks)
+                    stats[1] += 1
+            return {bid: tuple(stats) for bid, stats in sorted(totals.items())}
+        for segment in self.segments("bid", "bidder", "tricks"):
+            bids = segment["bid"]
+            team = segment["bidder"] % 2
+            taken = numpy.take_along_axis(segment["tricks"], team[:, None].astype(numpy.intp), 1)[:, 0]
+            success = taken >= numpy.minimum(bids, 8)
+            played = numpy.bincount(bids, minlength=12)
+            won = numpy.bincount(bids, weights=success, minlength=12)
+            for bid in numpy.flatnonzero(played):
+                stats = totals.setdefault(int(bid), [0, 0])
+                stats[0] += int(won[bid])
+                stats[1] += int(played[bid])
+        return {bid: tuple(stats) for bid, stats in sorted(totals.items())}
+
+    def shoot_success(self):
+        """(made, played) over every shoot, single to triple."""
+        rates = self.make_rate()
+        shoots = [rates[bid] for bid in rates if bid > 8]
+        return sum(won for won, _ in shoots), sum(played for _, played in shoots)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--game", type=int, help="print this game's hands instead of the rates")
+    args = parser.parse_args()
+
+    history = History(args.path)
+    if args.game is not None:
+        for record in history.replay(args.game):
+            print(json.dumps(record, separators=(",", ":")))
+        return
+    print(f"{len(history)} hands", file=sys.stderr)
+    for bid, (won, played) in history.make_rate().items():
+        label = ["shoot", "double shoot", "triple shoot"][bid - 9] if bid > 8 else f"bid {bid}"
+        print(f"{label:>13}: {played:8d} hands, made {won / played:6.1%}")
+    won, played = history.shoot_success()
+    if played:
+        print(f"{'all shoots':>13}: {played:8d} hands, made {won / played:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
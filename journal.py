@@ -0,0 +1,130 @@
+"""Append-only log of room inputs plus periodic snapshots, for restarts.
+
+Every accepted input (bids, shoot answers, gives, plays, deal seeds, room
+create/start/close) is appended to log.<gen>.jsonl as one JSON line. The
+lines are written and fsynced in batches by a writer thread, so append()
+only puts a record on a queue and never waits on the disk.
+
+snapshot() starts a new generation: records after it go to the next log
+file and the state handed in is written to snap.<gen>.json, after which
+older files are removed. load() returns the newest complete snapshot and
+the records logged since, so a restart replays only the tail of each hand.
+"""
+import json
+import os
+import re
+import sys
+
+if "eventlet" in sys.modules:
+    # a real thread even under monkey_patch, so fsync doesn't block the hub
+    from eventlet.patcher import original
+    threading = original("threading")
+    queue = original("queue")
+else:
+    import threading
+    import queue
+
+FILE = re.compile(r"(log|snap)\.(\d+)\.jsonl?$")
+
+
+class Journal:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.generation = max(self.generations(), default=0)
+        self.queue = queue.Queue()
+        self.writes = 0
+        self.syncs = 0
+        self.thread = threading.Thread(target=self.run, name="journal", daemon=True)
+        self.thread.start()
+
+    def generations(self):
+        return {int(match[2]) for match in map(FILE.match, os.listdir(self.path)) if match}
+
+    def file(self, kind, generation):
+        return os.path.join(self.path, f"{kind}.{generation}.json" + ("l" if kind == "log" else ""))
+
+    def append(self, record):
+        self.queue.put(("log", record))
+
+    def snapshot(self, state):
+        # the caller must not yield between deciding the state and this call,
+        # so that the state is exactly what the earlier logs add up to
+        self.generation += 1
+        self.queue.put(("snap", (self.generation, state)))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    # writer thread
+    def run(self):
+        generation = self.generation
+        log = open(self.file("log", generation), "a")
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is None:
+                    break
+                kind, data = item
+                if kind == "log":
+                    log.write(json.dumps(data, separators=(",", ":")) + "\n")
+                    self.writes += 1
+                else:
+                    self.sync(log)
+                    log.close()
+                    generation, state = data
+                    log = open(self.file("log", generation), "a")
+                    self.write_snapshot(generation, state)
+            self.sync(log)
+            if batch[-1] is None:
+                log.close()
+                return
+
+    def sync(self, log):
+        log.flush()
+        os.fsync(log.fileno())
+        self.syncs += 1
+
+    def write_snapshot(self, generation, state):
+        path = self.file("snap", generation)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        for old in self.generations():
+            if old < generation:
+                for kind in ("log", "snap"):
+                    try:
+                        os.remove(self.file(kind, old))
+                    except FileNotFoundError:
+                        pass
+
+    # recovery
+    def load(self):
+        """Return (snapshot state or {}, records logged after it)."""
+        snaps = sorted(g for g in self.generations() if os.path.exists(self.file("snap", g)))
+        start = snaps[-1] if snaps else 0
+        state = {}
+        if snaps:
+            with open(self.file("snap", start)) as f:
+                state = json.load(f)
+        records = []
+        for generation in sorted(g for g in self.generations() if g >= start):
+            try:
+                f = open(self.file("log", generation))
+            except FileNotFoundError:
+                continue
+            with f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break  # torn last line from a crash
+        return state, records
@@ -0,0 +1,35 @@
+"""Token buckets keyed by sid, for shedding floods at the handler edge.
+
+Each key gets `burst` tokens and earns `rate` more a second; a call that
+finds less than one token is refused. State is two numbers per key and
+is dropped with forget() when the sid disconnects.
+"""
+import time
+
+
+class Buckets:
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.state = {}  # key -> [tokens, time they were counted]
+
+    def __len__(self):
+        return len(self.state)
+
+    def allow(self, key):
+        now = self.clock()
+        state = self.state.get(key)
+        if state is None:
+            self.state[key] = [self.burst - 1, now]
+            return True
+        tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+        if tokens < 1:
+            state[0] = tokens
+            return False
+        state[0] = tokens - 1
+        return True
+
+    def forget(self, key):
+        self.state.pop(key, None)
@@ -0,0 +1,127 @@
+"""The public room list: an index kept up to date as rooms change.
+
+The server calls update() with a room's lobby line whenever something on
+it changes (create, join, leave, bots, start, game over) and remove() when
+the room goes away, so listing never looks at the rooms themselves. Rooms
+are filed by status (waiting, playing, finished) and free seats, each
+bucket a list sorted newest room first. page() merges the buckets with at
+least the seats asked for, starting after a cursor, and stops after
+`limit` rooms: its cost is the page, not the number of rooms.
+
+Changes are collected until drain(), which returns them per status as the
+lines to add or replace and the codes that left it, so the server can
+push them to each status's subscribers in one packet.
+
+With several workers every one keeps the whole list: each sends the
+changes to its own rooms to the others through a Feed per peer, plus its
+full list now and then, and files what it gets like its own lines.
+"""
+import bisect
+import collections
+import heapq
+import itertools
+import queue
+import threading
+import urllib.request
+
+STATUSES = ("waiting", "playing", "finished")
+SEATS = 6
+PAGE = 20
+
+
+class Lobby:
+    def __init__(self):
+        self.lines = {}  # room_code -> its line
+        self.keys = {}  # room_code -> (status, free, order)
+        self.buckets = {(status, free): [] for status in STATUSES for free in range(SEATS + 1)}
+        self.counts = collections.Counter()  # status -> rooms
+        self.orders = itertools.count()
+        self.dirty = {}  # room_code -> status its subscribers last saw (None if new)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def update(self, room_code, line):
+        if self.lines.get(room_code) == line:
+            return
+        key = self.keys.get(room_code)
+        self.dirty.setdefault(room_code, key and key[0])
+        if key:
+            self.unfile(room_code, key)
+            order = key[2]
+        else:
+            order = -next(self.orders)  # newest first
+        key = (line["status"], line["free"], order)
+        bisect.insort(self.buckets[key[:2]], (order, room_code))
+        self.counts[key[0]] += 1
+        self.keys[room_code] = key
+        self.lines[room_code] = line
+
+    def remove(self, room_code):
+        key = self.keys.pop(room_code, None)
+        if key is None:
+            return
+        self.dirty.setdefault(room_code, key[0])
+        self.unfile(room_code, key)
+        del self.lines[room_code]
+
+    def unfile(self, room_code, key):
+        bucket = self.buckets[key[:2]]
+        del bucket[bisect.bisect_left(bucket, (key[2], room_code))]
+        self.counts[key[0]] -= 1
+
+    def page(self, status, free=0, after=None, limit=PAGE):
+        """Up to limit lines with at least `free` seats, and the cursor for the next page."""
+        runs = []
+        for seats in range(max(0, free), SEATS + 1):
+            bucket = self.buckets[status, seats]
+            start = 0 if after is None else bisect.bisect_left(bucket, (after + 1,))
+            runs.append(itertools.islice(bucket, start, None))
+        found = list(itertools.islice(heapq.merge(*runs), limit + 1))
+        more = len(found) > limit
+        found = found[:limit]
+        return [self.lines[code] for _, code in found], found[-1][0] if more else None
+
+    def drain(self):
+        """The changes since the last drain: status -> (lines, removed codes)."""
+        changes = {}
+        for room_code, seen in self.dirty.items():
+            line = self.lines.get(room_code)
+            if seen and (line is None or line["status"] != seen):
+                changes.setdefault(seen, ([], []))[1].append(room_code)
+            if line:
+                changes.setdefault(line["status"], ([], []))[0].append(line)
+        self.dirty = {}
+        return changes
+
+
+class Feed:
+    """Lobby messages for one other worker, POSTed in order from a thread of its own.
+
+    sign turns a list of messages into the signed text the peer checks.
+    Whatever is queued while a POST is out goes in the next one; a failed
+    POST is dropped, since the next full list sets the peer right.
+    """
+
+    def __init__(self, url, sign, timeout=5):
+        self.url = url.rstrip("/") + "/internal/lobby"
+        self.sign = sign
+        self.timeout = timeout
+        self.pending = queue.Queue()
+        self.failed = 0
+        threading.Thread(target=self.run, name="lobby feed", daemon=True).start()
+
+    def send(self, message):
+        self.pending.put(message)
+
+    def run(self):
+        while True:
+            batch = [self.pending.get()]
+            while not self.pending.empty():
+                batch.append(self.pending.get_nowait())
+            request = urllib.request.Request(self.url, data=self.sign(batch).encode(), method="POST",
+                                             headers={"Content-Type": "text/plain"})
+            try:
+                urllib.request.urlopen(request, timeout=self.timeout).close()
+            except OSError:
+                self.failed += 1
@@ -0,0 +1,129 @@
+"""Counters and histograms served as Prometheus text on /metrics.
+
+Everything here is per process and only touched from the event loop, so a
+sample is a dict lookup and a couple of additions with no locking. With
+several workers each one serves its own /metrics.
+"""
+import bisect
+import json as _json
+import time
+from functools import wraps
+
+LATENCY = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+WAIT = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+COUNTS = (10, 100, 1000, 10_000, 100_000, 1_000_000)
+SIZES = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+registry = []
+
+
+def label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{label_text(self.labels, labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # labels -> [count per bucket..., +Inf count, sum]
+        registry.append(self)
+
+    def observe(self, value, *labels):
+        row = self.values.get(labels)
+        if row is None:
+            row = self.values[labels] = [0] * (len(self.buckets) + 2)
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def time(self, *labels):
+        """Decorator observing how long each call takes."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                began = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - began, *labels)
+            return wrapper
+        return decorator
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, row in sorted(self.values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row):
+                total += count
+                names = self.labels + ("le",)
+                yield f"{self.name}_bucket{label_text(names, labels + (bound,))} {total}"
+            yield f"{self.name}_sum{label_text(self.labels, labels)} {row[-1]}"
+            yield f"{self.name}_count{label_text(self.labels, labels)} {total}"
+
+
+class Gauge:
+    """A value read when scraped: fn returns a number or {label value: number}."""
+
+    def __init__(self, name, help, fn, label=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label = label
+        registry.append(self)
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        value = self.fn()
+        if self.label is None:
+            yield f"{self.name} {value}"
+        else:
+            for key, number in sorted(value.items()):
+                yield f"{self.name}{label_text((self.label,), (key,))} {number}"
+
+
+def render():
+    return "\n".join(line for metric in registry for line in metric.lines()) + "\n"
+
+
+class MeteredJSON:
+    """json module for the Socket.IO server that counts what it encodes.
+
+    Each emit is encoded once, so every dumps() is one packet. on_dumps is
+    called with the encoded length and decides where to count it. With
+    ensure_ascii (the default, which Socket.IO keeps) the text is ASCII, so
+    its length is its size in bytes and it isn't encoded a second time.
+    """
+
+    on_dumps = None
+
+    @classmethod
+    def dumps(cls, *args, **kwargs):
+        text = _json.dumps(*args, **kwargs)
+        if cls.on_dumps:
+            cls.on_dumps(len(text) if kwargs.get("ensure_ascii", True) else len(text.encode()))
+        return text
+
+    loads = staticmethod(_json.loads)
@@ -0,0 +1,133 @@
+"""Sampling profiler for the running server, and per-room span traces.
+
+Sampler reads every thread's current stack from a real OS thread
+(sys._current_frames) every `interval` seconds for `seconds` seconds, and
+counts each stack. Greenlets and asyncio tasks share the main thread, so
+its sample is whatever was running at that moment, or the hub or event
+loop waiting for I/O when nothing was. Each stack is filed under the
+first of these found in it: get_winner, render, game (Game's rules),
+bots, handler (a Socket.IO handler), idle (the hub or loop waiting), or
+other; other threads are filed under their name. collapsed() writes them
+in the folded format flamegraph.pl and speedscope read, with that
+category as the root frame.
+
+Trace keeps timestamped spans for one room until it expires, and
+chrome() writes them as Chrome trace events for chrome://tracing or
+Perfetto, one row per kind of span.
+"""
+import collections
+import os
+import sys
+import time
+
+if "eventlet" in sys.modules:
+    # a real thread, so it samples the hub instead of waiting for it
+    from eventlet.patcher import original
+    threading = original("threading")
+else:
+    import threading
+
+# where the main thread's innermost Python frame is when the hub or the
+# event loop is waiting for I/O (uvloop waits in C, under asyncio.run)
+IDLE = {"epolls.py", "poll.py", "hub.py", "selectors.py", "runners.py"}
+
+
+def category(stack, thread):
+    # stack is (file, function) pairs from the outermost frame in
+    if thread != "MainThread":
+        return thread.replace(";", ",")
+    names = {function for _, function in stack}
+    if "get_winner" in names or "get_winners" in names:
+        return "get_winner"
+    if "render" in names:
+        return "render"
+    if any(file == "game.py" for file, _ in stack):
+        return "game"
+    if any(file == "bots.py" for file, _ in stack):
+        return "bots"
+    if any(function.startswith(("handle_", "on_")) and file == "server.py" for file, function in stack):
+        return "handler"
+    if not stack or stack[-1][0] in IDLE:
+        return "idle"
+    return "other"
+
+
+class Sampler:
+    def __init__(self, seconds, interval=0.005):
+        self.seconds = seconds
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.categories = collections.Counter()
+        self.samples = 0
+        self.began = time.time()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="sampler", daemon=True)
+        self.thread.start()
+
+    @property
+    def running(self):
+        return self.thread.is_alive()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        until = time.monotonic() + self.seconds
+        me = threading.get_ident()
+        names = {}
+        while not self.stopped.wait(self.interval) and time.monotonic() < until:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                stack.reverse()
+                kind = category(stack, names.get(ident, "thread"))
+                self.categories[kind] += 1
+                self.stacks[(kind,) + tuple(f"{file}:{function}".replace(";", ",") for file, function in stack)] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        return {
+            "began": self.began,
+            "seconds": self.seconds,
+            "interval": self.interval,
+            "running": self.running,
+            "samples": self.samples,
+            "categories": dict(self.categories.most_common()),
+        }
+
+
+class Trace:
+    def __init__(self, room_code, seconds, limit=100_000):
+        self.room_code = room_code
+        self.until = time.monotonic() + seconds
+        self.spans = collections.deque(maxlen=limit)  # (name, start, seconds, args)
+        # perf_counter stamps are turned into wall-clock time on output
+        self.offset = time.time() - time.perf_counter()
+
+    @property
+    def live(self):
+        return time.monotonic() < self.until
+
+    def add(self, name, start, seconds, **args):
+        self.spans.append((name, start, seconds, args))
+
+    def chrome(self):
+        rows = {}
+        events = []
+        for name, start, seconds, args in self.spans:
+            row = rows.setdefault(name.split(":")[0], len(rows) + 1)
+            events.append({"name": name, "ph": "X", "pid": 1, "tid": row, "ts": (start + self.offset) * 1e6,
+                           "dur": seconds * 1e6, "args": args})
+        events += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": row, "args": {"name": kind}} for kind, row in rows.items()]
+        events.append({"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"room {self.room_code}"}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
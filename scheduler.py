@@ -0,0 +1,87 @@
+"""One heap of timers run by a single background task.
+
+call_later/call_at return a Timer that can be cancelled; cancelled timers
+stay in the heap and are skipped when they come up, so cancel is O(1).
+run() is the loop: spawn it once, on the thread (or hub) that adds timers.
+On asyncio, make the Scheduler with an asyncio.Event and run run_async()
+as a task on the loop instead.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+import traceback
+
+
+class Timer:
+    __slots__ = ("when", "fn", "args", "cancelled")
+
+    def __init__(self, when, fn, args):
+        self.when = when
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        self.fn = self.args = None
+
+
+class Scheduler:
+    def __init__(self, wake=None, clock=time.monotonic):
+        self.clock = clock
+        self.heap = []
+        self.counter = itertools.count()
+        self.wake = wake or threading.Event()
+        self.fired = 0
+        self.errors = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def call_at(self, when, fn, *args):
+        timer = Timer(when, fn, args)
+        first = not self.heap or when < self.heap[0][0]
+        heapq.heappush(self.heap, (when, next(self.counter), timer))
+        if first:
+            self.wake.set()
+        return timer
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(self.clock() + delay, fn, *args)
+
+    def run_due(self):
+        """Run every timer that is due; return seconds until the next one (or None)."""
+        heap = self.heap
+        while heap:
+            when, _, timer = heap[0]
+            if when > self.clock():
+                return when - self.clock()
+            heapq.heappop(heap)
+            if timer.cancelled:
+                continue
+            fn, args = timer.fn, timer.args
+            timer.cancel()
+            self.fired += 1
+            try:
+                fn(*args)
+            except Exception:
+                self.errors += 1
+                traceback.print_exc()
+        return None
+
+    def run(self):
+        while True:
+            delay = self.run_due()
+            self.wake.wait(delay)
+            self.wake.clear()
+
+    async def run_async(self):
+        while True:
+            delay = self.run_due()
+            try:
+                await asyncio.wait_for(self.wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
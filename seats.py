@@ -0,0 +1,55 @@
+"""Who is in a room and where they sit: sid <-> name <-> seat.
+
+All maps are kept up to date on join, leave and seating, so lookups in the
+hot paths are dict gets. A seat belongs to a name, not a sid: a player who
+reconnects with their session token gets their seat back. A name that has
+been seated is claimed for good, so nobody else can join under it.
+"""
+
+
+class Seats:
+    def __init__(self):
+        self.names = {}  # sid -> name
+        self.sids = {}  # name -> sid
+        self.order = []  # seat -> name
+        self.seat_of = {}  # name -> seat
+        self.seated = set()  # every name that has had a seat
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(list(self.names))
+
+    def __contains__(self, sid):
+        return sid in self.names
+
+    def taken(self, name):
+        return name in self.sids
+
+    def claimed(self, name):
+        return name in self.seated
+
+    def join(self, sid, name):
+        self.names[sid] = name
+        self.sids[name] = sid
+
+    def leave(self, sid):
+        name = self.names.pop(sid, None)
+        if name is not None and self.sids.get(name) == sid:
+            del self.sids[name]
+        return name
+
+    def seat(self, order):
+        self.order = list(order)
+        self.seat_of = {name: seat for seat, name in enumerate(self.order)}
+        self.seated.update(self.order)
+
+    def seat_for(self, sid):
+        return self.seat_of.get(self.names.get(sid))
+
+    def sid_for(self, seat):
+        return self.sids.get(self.order[seat])
+
+    def name(self, sid):
+        return self.names.get(sid)
@@ -1,467 +1,946 @@
-import eventlet
-eventlet.monkey_patch()
-
-from flask import Flask, render_template, request
-from flask_socketio import SocketIO, emit, join_room
+import os
+
+# RUNTIME=eventlet (the default) runs Flask-SocketIO on monkey-patched
+# eventlet; RUNTIME=asyncio runs the same handlers on asyncio (aio.py).
+# Imported rather than run (bench/), nothing is patched or started: the
+# scheduler task and the page assets are set up in __main__, bot workers
+# on the first bot move.
+RUNTIME = os.environ.get("RUNTIME", "eventlet")
+if RUNTIME == "eventlet" and __name__ == "__main__":
+    import eventlet
+    eventlet.monkey_patch()
+
+from flask import Flask, Response, abort, request
+if RUNTIME == "asyncio":
+    import asyncio
+    from aio import SocketIO, disconnect, emit, join_room, leave_room
+else:
+    from flask_socketio import SocketIO, disconnect, emit, join_room, leave_room
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+import hmac
 import string
-import threading
-import time
-from queue import Queue
 import random
+import subprocess
+import sys
+import time
+import zlib
+
+import build
+import delta
+import metrics
+import wire
+from game import Game, hand_vals
+from history import History
+from bots import Bots
+from journal import Journal
+from limits import Buckets
+from lobby import PAGE, STATUSES, Feed, Lobby
+from profiler import Sampler, Trace
+from scheduler import Scheduler
+from seats import Seats
+from sim import Policy, SimplePolicy
+
+# Sharding: with several workers each one owns the rooms whose code hashes
+# to its index and clients are sent to the owner's URL before joining.
+# MESSAGE_QUEUE (any Flask-SocketIO message queue URL, e.g. a local redis)
+# lets an emit reach a sid connected to another worker.
+SHARD_URLS = [url for url in os.environ.get("SHARD_URLS", "").split(",") if url]
+SHARD = int(os.environ.get("SHARD", 0))
+
+# JOURNAL_DIR turns on the input log and snapshots used to rebuild rooms
+# after a restart (one subdirectory per shard).
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR")
+HISTORY_DIR = os.environ.get("HISTORY_DIR")  # every finished hand, see history.py
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", 60))
+
+# Rooms nobody is connected to are kept ABANDON_TIMEOUT seconds for a
+# rejoin, rooms where nothing happens are closed after IDLE_TIMEOUT.
+ABANDON_TIMEOUT = float(os.environ.get("ABANDON_TIMEOUT", 300))
+IDLE_TIMEOUT = float(os.environ.get("IDLE_TIMEOUT", 3600))
+
+# A seat that doesn't answer within TURN_TIMEOUT seconds (RECONNECT_GRACE
+# if its player is disconnected) is answered for: pass, the minimum bid
+# when it must bid, or the first legal card. 0 turns either off.
+TURN_TIMEOUT = float(os.environ.get("TURN_TIMEOUT", 90))
+RECONNECT_GRACE = float(os.environ.get("RECONNECT_GRACE", 30))
+AUTOPILOT = Policy()
+
+# Bot seats answer BOT_DELAY seconds after their prompt, so people can
+# follow along. Bids, shoots and gives come from the hand-strength tables;
+# plays are searched in BOT_WORKERS processes (bots.py) and fall back to
+# the table policy if the search isn't back within BOT_BUDGET seconds.
+BOT_DELAY = float(os.environ.get("BOT_DELAY", 0.5))
+BOT_BUDGET = float(os.environ.get("BOT_BUDGET", 0.05))
+BOT_POLL = 0.005
+BOT_POLICY = SimplePolicy()
+
+# join_success carries a token signed with SECRET_KEY naming the room and
+# seat; "resume" with it rebinds a new connection to that seat. Without
+# SECRET_KEY a key is generated once and kept in JOURNAL_DIR, so tokens
+# outlive the restarts recover() brings rooms back from; in production one
+# of the two is required (run_workers shares the key between shards). Seated
+# players get a fresh token every third of SESSION_TTL, since a claimed name
+# is only taken back with one. The last PATCH_LOG table patches are kept so a
+# resume only gets what it missed.
+def load_secret_key():
+    if os.environ.get("SECRET_KEY"):
+        return os.environ["SECRET_KEY"]
+    if JOURNAL_DIR:
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        path = os.path.join(JOURNAL_DIR, "secret_key")
+        try:
+            with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+                f.write(os.urandom(24).hex())
+        except FileExistsError:
+            pass
+        with open(path) as f:
+            return f.read().strip()
+    if os.environ.get("FLASK_ENV") == "production":
+        raise SystemExit("Set SECRET_KEY (or JOURNAL_DIR) so session tokens survive restarts")
+    return os.urandom(24).hex()  # development: tokens last until the next restart
+
+SECRET_KEY = load_secret_key()
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 6 * 3600))
+PATCH_LOG = 64
+sessions = URLSafeTimedSerializer(SECRET_KEY, salt="seat")
+peer_messages = URLSafeTimedSerializer(SECRET_KEY, salt="lobby")
+
+# Every client event costs a token from its sid's bucket (RATE a second,
+# up to BURST saved); signal relays have their own, larger bucket since
+# trickle ICE comes in bursts. Events without a token are dropped unread.
+RATE = float(os.environ.get("RATE", 20))
+BURST = float(os.environ.get("BURST", 40))
+SIGNAL_RATE = float(os.environ.get("SIGNAL_RATE", 50))
+SIGNAL_BURST = float(os.environ.get("SIGNAL_BURST", 100))
+
+# ADMIN_TOKEN turns on /admin/profile and /admin/trace/<room> for requests
+# that carry it as a bearer token; without it they don't exist.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+PROFILE_LIMIT = 300  # longest profile or trace, in seconds
+
+# Public rooms are listed in the lobby (lobby.py); changes to the list are
+# pushed to its subscribers together every LOBBY_WINDOW seconds. With
+# several workers each one lists every worker's rooms: it POSTs changes to
+# its own to the others (at PEER_URLS, or SHARD_URLS if they can reach
+# those), signed with SECRET_KEY, and its full list every LOBBY_SYNC
+# seconds; a worker not heard from in three of those is dropped.
+LOBBY_WINDOW = float(os.environ.get("LOBBY_WINDOW", 0.25))
+LOBBY_SYNC = float(os.environ.get("LOBBY_SYNC", 30))
+PEER_URLS = [url for url in os.environ.get("PEER_URLS", "").split(",") if url] or SHARD_URLS
+
+# ICE candidates from one peer to another are held this long and relayed
+# together as one signal_batch.
+SIGNAL_WINDOW = float(os.environ.get("SIGNAL_WINDOW", 0.05))
 
 app = Flask(__name__)
-socketio = SocketIO(app, ping_timeout=300, ping_interval=10, async_mode='eventlet')
+socketio = SocketIO(app, ping_timeout=300, ping_interval=10, async_mode="asgi" if RUNTIME == "asyncio" else "eventlet",
+                    message_queue=os.environ.get("MESSAGE_QUEUE"), json=metrics.MeteredJSON,
+                    cors_allowed_origins=SHARD_URLS or None)
 
 # Tracks room code -> data
-rooms = {}  # room_code: { players, player_names, game_state }
+rooms = {}  # room_code: { seats, game, ... }
 user_sid_to_room = {}
 user_sid_to_name = {}
-
-
-class Card:
-    __suit_to_symbol = {
-        "spades": "♠",
-        "clubs": "♣",
-        "hearts": "♥",
-        "diamonds": "♦"
-    }
-    __rank_to_symbol = {
-        "9": "9",
-        "10": "10",
-        "jack": "J",
-        "queen": "Q",
-        "king": "K",
-        "ace": "A"
-    }
-
-    def __init__(self, suit, rank):
-        self.suit = suit.lower() if suit else ""
-        self.rank = rank.lower() if rank else ""
-
-        if self.rank in Card.__rank_to_symbol and self.suit in Card.__suit_to_symbol:
-            self.val = f"{Card.__rank_to_symbol[self.rank]}{Card.__suit_to_symbol[self.suit]}"
+connections = 0
+wire_formats = {}  # sid -> "compact" for clients that asked
+journal = None
+history = None
+scheduler = Scheduler(asyncio.Event()) if RUNTIME == "asyncio" else Scheduler()
+reaped = 0
+bots = Bots(int(os.environ.get("BOT_WORKERS", 1)), budget=BOT_BUDGET)
+pending_signals = {}  # (from sid, target sid) -> ICE candidates waiting for the batch
+limits = {"input": Buckets(RATE, BURST), "signal": Buckets(SIGNAL_RATE, SIGNAL_BURST)}
+sampler = None  # the last profile started from /admin/profile
+traces = {}  # room_code -> its last Trace
+lobby = Lobby()
+lobby_flush = None  # timer for the next lobby_update
+lobby_sids = {}  # sid -> lobby status it follows
+feeds = {}  # shard -> Feed to that worker
+peers_seen = {}  # shard -> when its last full list came in
+
+handler_seconds = metrics.Histogram("sixhand_handler_seconds", "Time spent in each Socket.IO event handler", ("event",))
+render_seconds = metrics.Histogram("sixhand_render_seconds", "Time to diff and send game_state to a room")
+prompt_wait = metrics.Histogram("sixhand_prompt_wait_seconds", "Time from a prompt to the answer the game accepted", ("op",), metrics.WAIT)
+sent_packets = metrics.Counter("sixhand_sent_packets_total", "Socket.IO packets encoded")
+sent_bytes = metrics.Counter("sixhand_sent_bytes_total", "Bytes of encoded Socket.IO packets")
+metrics.Gauge("sixhand_rooms", "Rooms with and without connected players", lambda: {
+    "live": sum(1 for room in rooms.values() if room["seats"]),
+    "idle": sum(1 for room in rooms.values() if not room["seats"]),
+}, "state")
+bot_moves = metrics.Counter("sixhand_bot_moves_total", "Bot answers by where they came from", ("source",))
+bot_wait = metrics.Histogram("sixhand_bot_search_seconds", "Time from a bot's play prompt to its card, search or fallback")
+relayed_signals = metrics.Counter("sixhand_signals_total", "WebRTC signals relayed or dropped", ("kind",))
+signal_batches = metrics.Counter("sixhand_signal_batches_total", "signal_batch packets sent")
+rate_limited = metrics.Counter("sixhand_rate_limited_total", "Client events dropped for coming too fast", ("event",))
+resumes = metrics.Counter("sixhand_resumes_total", "Seats taken back with a session token, by what was resent", ("resync",))
+metrics.Gauge("sixhand_lobby_rooms", "Public rooms in the lobby by status", lambda: {status: lobby.counts[status] for status in STATUSES}, "status")
+metrics.Gauge("sixhand_reaped_rooms", "Rooms closed by the reaper", lambda: reaped)
+metrics.Gauge("sixhand_connections", "Connected sockets", lambda: connections)
+# per room, observed when it closes: a label per room code would be a new series per room
+room_packets = metrics.Histogram("sixhand_room_packets", "Packets sent for a room over its life", buckets=metrics.COUNTS)
+room_bytes = metrics.Histogram("sixhand_room_bytes", "Bytes sent for a room over its life", buckets=metrics.SIZES)
+
+# Room whose handler or timer is running, so encoded packets can be counted
+# against it: set around each one and put back after, so nothing else is
+# charged to it. A context variable, since aio.py encodes an emit later, in
+# the context it was made in.
+current_room = ContextVar("current_room", default=None)
+
+@contextmanager
+def counting(room_code):
+    token = current_room.set(room_code)
+    try:
+        yield
+    finally:
+        current_room.reset(token)
+
+def count_sent(size):
+    sent_packets.inc()
+    sent_bytes.inc(amount=size)
+    room = rooms.get(current_room.get())
+    if room:
+        room["packets"] += 1
+        room["bytes"] += size
+
+metrics.MeteredJSON.on_dumps = count_sent
+
+def on(event):
+    """socketio.on for client events: rate limited, timed, and noting the room."""
+    def decorator(fn):
+        timed = handler_seconds.time(event)(fn)
+        bucket = limits["signal" if event == "signal" else "input"]
+
+        @wraps(fn)
+        def handler(*args):
+            if not bucket.allow(request.sid):
+                rate_limited.inc(event)
+                return
+            began = time.perf_counter()
+            try:
+                with counting(user_sid_to_room.get(request.sid)):
+                    return timed(*args)
+            finally:
+                trace = tracing(user_sid_to_room.get(request.sid))
+                if trace:
+                    trace.add(f"handler:{event}", began, time.perf_counter() - began, sid=request.sid)
+        return socketio.on(event)(handler)
+    return decorator
+
+
+def tracing(room_code):
+    # the room's trace while it is recording, else None; one dict get when off
+    trace = traces.get(room_code)
+    return trace if trace and trace.live else None
+
+
+def record(room_code, op, **data):
+    if journal:
+        journal.append({"r": room_code, "op": op, **data})
+
+
+class RoomGame(Game):
+    trick_pause = float(os.environ.get("TRICK_PAUSE", Game.trick_pause))
+
+    def __init__(self, room_code, players):
+        super().__init__(players)
+        self.room_code = room_code
+        # while rebuilding from the journal nothing is sent or logged and
+        # deals take their seeds from the log
+        self.replaying = False
+        self.replay_seeds = []
+        self.asked = time.perf_counter()
+        self.deadline = None  # timer answering for the seat we wait on
+        self.pause = None  # timer ending the trick on display
+        self.gid = random.getrandbits(63)  # the game's id in the hand history
+
+    def prompt(self, seat, event, data=None):
+        if self.replaying:
+            return
+        self.asked = time.perf_counter()
+        if self.players[seat] in rooms[self.room_code]["bots"]:
+            # 🤖 answered from the scheduler, never inside the game call that asked;
+            # with no people left the table waits for one to come back
+            if self.deadline:
+                self.deadline.cancel()
+            self.deadline = scheduler.call_later(BOT_DELAY, self.bot_turn, seat, event, data) if rooms[self.room_code]["seats"] else None
+            return
+        sid = sid_for(self.room_code, seat)
+        self.arm(seat, grace=sid is None)
+        if sid:
+            send(event, data, sid)
+
+    def arm(self, seat, grace=False):
+        if self.deadline:
+            self.deadline.cancel()
+        timeout = RECONNECT_GRACE if grace else TURN_TIMEOUT
+        if not rooms[self.room_code]["seats"]:
+            timeout = 0  # nobody left to play with; wait for a rejoin or the reaper
+        self.deadline = scheduler.call_later(timeout, self.timed_out, seat, self.phase) if timeout else None
+
+    def rearm(self):
+        # a game waiting on a person always has a timer: arm() sets none
+        # while the room is empty, or recover() left the seat unwatched
+        if self.deadline is None and self.phase in ("bidding", "shoot", "give", "playing") \
+                and self.players[self.turn] not in rooms[self.room_code]["bots"]:
+            self.arm(self.turn, grace=sid_for(self.room_code, self.turn) is None)
+
+    def timed_out(self, seat, phase):
+        self.deadline = None
+        room = rooms.get(self.room_code)
+        if not room or room["game"] is not self or self.turn != seat or self.phase != phase:
+            return
+        with counting(self.room_code):
+            sid = sid_for(self.room_code, seat)
+            if sid:
+                # before acting, since the answer may prompt this seat again
+                socketio.emit("turn_timeout", to=sid)
+            if phase == "bidding":
+                self.place_bid(seat, *AUTOPILOT.bid(self, seat, {"mustBid": self.must_bid()}))
+            elif phase == "shoot":
+                self.shoot_cards(seat, *AUTOPILOT.shoot(self, seat))
+            elif phase == "give":
+                self.give_card(seat, AUTOPILOT.give(self, seat))
+            elif phase == "playing":
+                self.play_card(seat, AUTOPILOT.play(self, seat))
+
+    def bot_turn(self, seat, event, data):
+        self.deadline = None
+        room = rooms.get(self.room_code)
+        if not room or room["game"] is not self or self.turn != seat:
+            return
+        if event == "play_now":
+            self.bot_play(seat, bots.submit(self, seat), time.perf_counter())
+            return
+        bot_moves.inc("table")
+        with counting(self.room_code):
+            if event == "bid_now":
+                self.place_bid(seat, *BOT_POLICY.bid(self, seat, data))
+            elif event == "shoot_now":
+                self.shoot_cards(seat, *BOT_POLICY.shoot(self, seat))
+            elif event == "give_shoot":
+                self.give_card(seat, BOT_POLICY.give(self, seat))
+
+    def bot_play(self, seat, future, began):
+        self.deadline = None
+        room = rooms.get(self.room_code)
+        if not room or room["game"] is not self or self.turn != seat:
+            future.cancel()
+            return
+        waited = time.perf_counter() - began
+        if not future.done() and waited < BOT_BUDGET:
+            self.deadline = scheduler.call_later(BOT_POLL, self.bot_play, seat, future, began)
+            return
+        if future.done() and not future.cancelled() and future.exception() is None:
+            card = future.result()
+            how = "search"
         else:
-            self.val = ""
-
-    def __eq__(self, other):
-        return isinstance(other, Card) and self.suit == other.suit and self.rank == other.rank
-
-    def __hash__(self):
-        return hash((self.suit, self.rank))
-
-
-class Deck():
-    def __init__(self):
-        self.deck = []
-
-    def initialize_deck(self):
-        suits = ["diamonds", "hearts", "clubs", "spades"]
-        ranks = ["9", "10", "jack", "queen", "king", "ace"]
-        for _ in range(2):
-            for suit in suits:
-                for rank in range(6):
-                    self.deck.append(Card(suit, ranks[rank]))
-        return self
-
-    def shuffle_deck(self):
-        random.shuffle(self.deck)
-        return self
-
-    def draw_card(self):
-        return self.deck.pop(0)
-
-
-class Bid():
-    def __init__(self, bid, suit):
-        self.bid = bid
-        self.suit = suit
-
-
-def reset_game_state(room_code):
-    rooms[room_code]["game_state"] = {
-        "scores": rooms[room_code]["game_state"]["scores"],
-        "tricks": {"Team_1": 0, "Team_2": 0},
-        "length": [0, 0, 0, 0, 0, 0],
-        "hands": [[], [], [], [], [], []],
-        "plays": [None, None, None, None, None, None],
-        "players": rooms[room_code]["game_state"]["players"],
-        "bids": ["", "", "", "", "", ""]
-    }
-
-def reset_plays(room_code):
-    rooms[room_code]["game_state"]["plays"] = [None, None, None, None, None, None]
-
-def gen_card(val):
-    symbol_to_suit = {
-        "♠": "spades",
-        "♣": "clubs",
-        "♥": "hearts",
-        "♦": "diamonds"
-    }
-    symbol_to_rank = {
-        "9": "9",
-        "10": "10",
-        "J": "jack",
-        "Q": "queen",
-        "K": "king",
-        "A": "ace"
-    }
-    suit_symbol = val[-1]
-    rank_symbol = val[:-1]
-
-    suit = symbol_to_suit[suit_symbol]
-    rank = symbol_to_rank[rank_symbol.upper()]
-
-    return Card(suit, rank)
+            future.cancel()
+            card = BOT_POLICY.play(self, seat)
+            how = "fallback"
+        bot_moves.inc(how)
+        bot_wait.observe(waited)
+        trace = tracing(self.room_code)
+        if trace:
+            trace.add(f"bot:{how}", began, waited, seat=seat)
+        with counting(self.room_code):
+            self.play_card(seat, card)
+
+    def stop(self):
+        for timer in (self.deadline, self.pause):
+            if timer:
+                timer.cancel()
+
+    def changed(self):
+        if not self.replaying:
+            touch(self.room_code)
+            render(self.room_code)
+
+    def finished(self, winner):
+        if not self.replaying:
+            socketio.emit("winner", {"winner": winner}, to=self.room_code)
+            list_room(self.room_code)
+
+    def hand_over(self, record):
+        # hands replayed from the journal were recorded the first time round
+        if history is not None and not self.replaying:
+            history.append({**record, "game": self.gid, "hand": len(self.scores["Team_1"]) - 1})
+
+    def log(self, op, **data):
+        if not self.replaying:
+            record(self.room_code, op, **data)
+
+    def answered(self, op, **data):
+        if not self.replaying:
+            now = time.perf_counter()
+            prompt_wait.observe(now - self.asked, op)
+            trace = tracing(self.room_code)
+            if trace:
+                trace.add(f"wait:{op}", self.asked, now - self.asked, seat=data.get("seat"))
+        self.log(op, **data)
+
+    def deal(self, seed=None):
+        if self.replaying and self.replay_seeds:
+            seed = self.replay_seeds.pop(0)
+        super().deal(seed)
+        self.log("deal", seed=self.seed)
+
+    def place_bid(self, seat, value, suit):
+        ok = super().place_bid(seat, value, suit)
+        if ok:
+            self.answered("bid", seat=seat, value=value, suit=suit)
+        return ok
+
+    def shoot_cards(self, seat, mode, takes, rid):
+        ok = super().shoot_cards(seat, mode, takes, rid)
+        if ok:
+            self.answered("shoot", seat=seat, mode=mode, takes=list(takes), rid=rid)
+        return ok
+
+    def give_card(self, seat, card):
+        ok = super().give_card(seat, card)
+        if ok:
+            self.answered("give", seat=seat, card=card)
+        return ok
+
+    def play_card(self, seat, card):
+        ok = super().play_card(seat, card)
+        if ok:
+            self.answered("play", seat=seat, card=card)
+        return ok
+
+    def later(self, delay, fn):
+        if self.replaying:
+            fn()
+            return
 
+        def run():
+            # the room may have been torn down during the pause
+            if self.room_code in rooms and rooms[self.room_code]["game"] is self:
+                with counting(self.room_code):
+                    fn()
+        self.pause = scheduler.call_later(delay, run)
+
+
+def sid_for(room_code, seat):
+    return rooms[room_code]["seats"].sid_for(seat)
+
+def seat_for(room_code, sid):
+    return rooms[room_code]["seats"].seat_for(sid)
+
+def send(event, data, sid):
+    if sid in wire_formats:
+        data = wire.pack(event, data)
+    socketio.emit(event, data, to=sid)
+
+def listen(room_code, sid):
+    # Compact and JSON clients get the table broadcast from their own socket.io room
+    group = "compact" if sid in wire_formats else "json"
+    rooms[room_code]["listeners"][group].add(sid)
+    join_room(f"{room_code}/{group}", sid=sid)
+
+def send_hand(room_code, sid, seat):
+    hand = hand_vals(rooms[room_code]["game"].hands[seat])
+    if rooms[room_code]["hands"].get(sid) != hand:
+        rooms[room_code]["hands"][sid] = hand
+        send('hand', {"seat": seat, "hand": hand}, sid)
+
+def send_state(room_code, sid):
+    # The whole table at the room's current version (join, resync after a
+    # gap), then this seat's hand; later updates come from render().
+    room = rooms[room_code]
+    version, view, compact = room["table"]
+    if view is None:
+        return
+    send('game_state', {"v": version, "full": compact if sid in wire_formats else view}, sid)
+    seat = seat_for(room_code, sid)
+    if seat is not None:
+        room["hands"].pop(sid, None)
+        send_hand(room_code, sid, seat)
+
+def send_since(room_code, sid, seen):
+    # 🔁 Patches after version `seen` if they are all still in the log,
+    # else the whole table; then this seat's hand.
+    room = rooms[room_code]
+    version, view, compact = room["table"]
+    patches = room["patches"]
+    if view is None or not 0 < seen <= version or seen < version and (not patches or seen + 1 < patches[0][0]):
+        resumes.inc("full")
+        send_state(room_code, sid)
+        return
+    resumes.inc("patches" if seen < version else "none")
+    for number, patch, compact_patch in patches:
+        if number > seen:
+            send('game_state', {"v": number, "patch": compact_patch if sid in wire_formats else patch}, sid)
+    seat = seat_for(room_code, sid)
+    if seat is not None:
+        room["hands"].pop(sid, None)
+        send_hand(room_code, sid, seat)
+
+@render_seconds.time()
 def render(room_code):
-    for sid in rooms[room_code]["players"]:
-        r_g_s = rooms[room_code]["game_state"]
-        indx = rooms[room_code]["order"].index(rooms[room_code]["player_names"][sid])
-        game_state = {
-            "scores": {"us": r_g_s["scores"]["Team_1"], "them": r_g_s["scores"]["Team_2"]} if indx % 2 == 0 else {"us": r_g_s["scores"]["Team_2"], "them": r_g_s["scores"]["Team_1"]},
-            "tricks": {"us": r_g_s["tricks"]["Team_1"], "them": r_g_s["tricks"]["Team_2"]} if indx % 2 == 0 else {"us": r_g_s["tricks"]["Team_2"], "them": r_g_s["tricks"]["Team_1"]},
-            "length": [],
-            "plays": [],
-            "players": [],
-            "bids": []
-        }
-        game_state["hand"] = rooms[room_code]["game_state"]["hands"][indx]
-        for x in range(6):
-            x = (x + indx + 1) % 6
-            if x != indx:
-                game_state["length"].append(r_g_s["length"][x])
-                play = r_g_s["plays"][x]
-                game_state["plays"].append(play.val if play else "")
-                game_state["players"].append(r_g_s["players"][x])
-                game_state["bids"].append(r_g_s["bids"][x])
-            else:
-                play = r_g_s["plays"][x]
-                game_state["plays"].append(play.val if play else "")
-                game_state["bids"].append(r_g_s["bids"][x])
-
-        socketio.emit('game_state', game_state, to=sid)
-
-def update_hands(room_code):
-    hands = rooms[room_code]["game_hands"]
-    val_hands = []
-    for hand in hands:
-        val_hand = []
-        for card in hand:
-            val_hand.append(card.val)
-        val_hands.append(val_hand)
-    rooms[room_code]["game_state"]["hands"] = val_hands
-    rooms[room_code]["game_state"]["length"] = [len(hand) for hand in val_hands]
-
-def sort_hand(hand):
-    new_hand = []
-    suits = ["diamonds", "hearts", "clubs", "spades"]
-    ranks = ["9", "10", "jack", "queen", "king", "ace"]
-    for suit in suits:
-        suit_hand = []
-        for card in hand:
-            if card.suit == suit:
-                suit_hand.append(card)
-        for rank in ranks:
-            for card in suit_hand:
-                if card.rank == rank:
-                    new_hand.append(card)
-    return new_hand
-
-def sort_hands(hands):
-    new_hands = []
-    for hand in hands:
-        new_hands.append(sort_hand(hand))
-    return new_hands
-
-def get_trump(room_code, start):
-    dic = {"♦": "diamonds", "♥": "hearts", "♣": "clubs", "♠": "spades", "↓": "low", "↑": "high", "Pass": "pass", "Shoot": "shoot", "Double Shoot": "shoot", "Triple Shoot": "shoot"}
-    bids = []
-    shoots = ["Shoot", "Double Shoot", " Triple Shoot"]
-    highest = 0
-    already_shot = False
-    shooot = 0
-
-    for x in range(6):
-        bider = (x + start) % 6
-        nts = {v: k for k, v in rooms[room_code]["player_names"].items()}
-        sid = nts[rooms[room_code]["game_state"]["players"][bider]]
-        if x == 5 and highest < 4:
-            socketio.emit("bid_now", {"highest": highest, "alreadyShot": already_shot, "mustBid": True}, to=sid)
-        else:
-            socketio.emit("bid_now", {"highest": highest, "alreadyShot": already_shot, "mustBid": False}, to=sid)
-        bid = rooms[room_code]["queues"]["bids"].get()[1]
-        if bid["bid"] > highest:
-            highest = bid["bid"]
-        if bid["bid"] < 9:
-            bids.append(Bid(bid["bid"], dic[bid["suit"]]))
-        else:
-            shooot += 1
-            bids.append(Bid(bid["bid"] + shooot, dic[bid["suit"]]))
-        if bid["bid"] > 8:
-            rooms[room_code]["game_state"]["bids"][bider] = f"{shoots[bid['bid'] - 9]}"
-        elif bid["bid"] == 0:
-            rooms[room_code]["game_state"]["bids"][bider] = "Pass"
-        else:
-            rooms[room_code]["game_state"]["bids"][bider] = f"{bid['bid']} {bid['suit']}"
-        render(room_code)
-    return bids
-
-def get_plays(room_code, start, high, shoots=None, shoot=False):
-    plays = []
-    first = None
-    for x in range(6):
-        y = (start - 6) + x
-        if shoot:
-            if rooms[room_code]["order"][y] in shoots:
-                continue
-        nts = {v: k for k, v in rooms[room_code]["player_names"].items()}
-        sid = nts[rooms[room_code]["game_state"]["players"][y]]
-        socketio.emit("play_now", {"x": x, "high": {"bid": high.bid, "suit": high.suit}, "first": first}, to=sid)
-        card = rooms[room_code]["queues"]["play_cards"].get()[1]
-        if x == 0:
-            first = card
-        plays.append(gen_card(f"{card['rank']}{card['suit']}"))
-        rooms[room_code]["game_hands"][y].remove(gen_card(f"{card['rank']}{card['suit']}"))
-        rooms[room_code]["game_state"]["plays"][y] = gen_card(f"{card['rank']}{card['suit']}")
-        update_hands(room_code)
-        render(room_code)
-    time.sleep(3)
-    return plays
-
-def get_winner(plays, high):
-    high = high.suit.lower()
-    dic = {"diamonds": "hearts", "hearts": "diamonds", "clubs": "spades", "spades": "clubs"}
-    def get_rank(card, high):
-        all_ranks = [["9", "10", "jack", "queen", "king", "ace"], ["9", "10", "queen", "king", "ace", "jack"]]
-        if card.suit == high:
-            rank = all_ranks[1].index(card.rank)
-        else:
-            rank = all_ranks[0].index(card.rank)
-        return rank
-    highest = plays[0]
-    high_index = 0
-    if high == "low":
-        for card in plays[1::]:
-            if get_rank(highest, high) > get_rank(card, high) and card.suit == highest.suit:
-                highest = card
-                high_index = plays.index(card)
-            else:
-               continue
-    elif high == "high":
-        for card in plays[1::]:
-            if get_rank(highest, high) < get_rank(card, high) and card.suit == highest.suit:
-                highest = card
-                high_index = plays.index(card)
-            else:
-                continue
+    # 📣 One patch per format for the room, however many are watching,
+    # then each seat's hand if it changed.
+    room = rooms[room_code]
+    trace = tracing(room_code)
+    began = time.perf_counter()
+    view = wire.table_view(room["game"])
+    compact = wire.compact_table(view)
+    version, last, last_compact = room["table"]
+    if last is None:
+        room["table"] = (version + 1, view, compact)
+        room["patches"].clear()
+        for group, table in (("json", view), ("compact", compact)):
+            if room["listeners"][group]:
+                socketio.emit('game_state', {"v": version + 1, "full": table}, to=f"{room_code}/{group}")
     else:
-        for card in plays[1::]:
-            if highest.suit != high and card.suit == high:
-                if dic[high] == highest.suit and highest.rank == "jack" and card.rank != "jack":
-                    continue
-                else:
-                    highest = card
-                    high_index = plays.index(card)
-            elif highest.suit == high and card.suit != high:
-                if dic[high] == card.suit and card.rank == "jack" and highest.rank != "jack":
-                    highest = card
-                    high_index = plays.index(card)
-                else:
-                    continue
-            elif highest.suit == high and card.suit == high:
-                if get_rank(highest, high) >= get_rank(card, high):
-                    continue
-                else:
-                    highest = card
-                    high_index = plays.index(card)
-            else:
-                if dic[high] == highest.suit and highest.rank == "jack":
-                    continue
-                else:
-                    if dic[high] == card.suit and card.rank == "jack":
-                        highest = card
-                        high_index = plays.index(card)
-                    else:
-                        if get_rank(highest, high) >= get_rank(card, high):
-                            continue
-                        else:
-                            highest = card
-                            high_index = plays.index(card)
-    return high_index
-
-def change_cards(room_code, bid_index):
-    symbol_to_suit = {
-        "♠": "spades",
-        "♣": "clubs",
-        "♥": "hearts",
-        "♦": "diamonds",
-        "↑": "high",
-        "↓": "low"
-    }
-    nts = {v: k for k, v in rooms[room_code]["player_names"].items()}
-    sid = nts[rooms[room_code]["game_state"]["players"][bid_index]]
-    team_1 = rooms[room_code]["game_state"]["players"][(bid_index + 2) % 6]
-    team_2 = rooms[room_code]["game_state"]["players"][(bid_index + 4) % 6]
-    socketio.emit("shoot_now", {"teammates": [team_1, team_2]}, to=sid)
-    answer = rooms[room_code]["queues"]["shoots"].get()[1]
-    high = Bid(9, symbol_to_suit[answer["trump"]])
-    teammate_1 = answer[team_1]
-    teammate_2 = answer[team_2]
-    for card in answer["rid"]:
-        rooms[room_code]["game_hands"][bid_index].remove(gen_card(f"{card['rank']}{card['suit']}"))
-    rooms[room_code]["game_state"]["bids"][bid_index] = answer["trump"]
-    rooms[room_code]["game_state"]["bids"][(bid_index + 2) % 6] = teammate_1
-    rooms[room_code]["game_state"]["bids"][(bid_index + 4) % 6] = teammate_2
-    update_hands(room_code)
-    render(room_code)
-    for _ in range(teammate_1):
-        sid = nts[rooms[room_code]["game_state"]["players"][(bid_index + 2) % 6]]
-        socketio.emit("give_shoot", to=sid)
-        card = rooms[room_code]["queues"]["give"].get()[1]
-        rooms[room_code]["game_hands"][(bid_index + 2) % 6].remove(gen_card(f"{card['rank']}{card['suit']}"))
-        rooms[room_code]["game_hands"][bid_index].append(gen_card(f"{card['rank']}{card['suit']}"))
-        rooms[room_code]["game_hands"][bid_index] = sort_hand(rooms[room_code]["game_hands"][bid_index])
-        update_hands(room_code)
-        render(room_code)
-    for _ in range(teammate_2):
-        sid = nts[rooms[room_code]["game_state"]["players"][(bid_index + 4) % 6]]
-        socketio.emit("give_shoot", to=sid)
-        card = rooms[room_code]["queues"]["give"].get()[1]
-        rooms[room_code]["game_hands"][(bid_index + 4) % 6].remove(gen_card(f"{card['rank']}{card['suit']}"))
-        rooms[room_code]["game_hands"][bid_index].append(gen_card(f"{card['rank']}{card['suit']}"))
-        rooms[room_code]["game_hands"][bid_index] = sort_hand(rooms[room_code]["game_hands"][bid_index])
-        update_hands(room_code)
-        render(room_code)
-    rooms[room_code]["game_state"]["bids"] = ["" if x != bid_index else rooms[room_code]["game_state"]["bids"][x] for x in range(6)]
-    render(room_code)
-
-    return high
+        patch = delta.diff(last, view)
+        if patch:
+            room["table"] = (version + 1, view, compact)
+            compact_patch = delta.diff(last_compact, compact)
+            room["patches"].append((version + 1, patch, compact_patch))
+            if room["listeners"]["json"]:
+                socketio.emit('game_state', {"v": version + 1, "patch": patch}, to=f"{room_code}/json")
+            if room["listeners"]["compact"]:
+                socketio.emit('game_state', {"v": version + 1, "patch": compact_patch}, to=f"{room_code}/compact")
+    sent = time.perf_counter()
+    for seat in range(6):
+        sid = sid_for(room_code, seat)
+        if sid:
+            send_hand(room_code, sid, seat)
+    if trace:
+        trace.add("render:table", began, sent - began, v=room["table"][0],
+                  listeners=len(room["listeners"]["json"]) + len(room["listeners"]["compact"]))
+        trace.add("render:hands", sent, time.perf_counter() - sent)
+
+def list_room(room_code):
+    # 📋 refile the room in the lobby after anything its line shows changed
+    room = rooms.get(room_code)
+    if room is None or not room["public"]:
+        lobby.remove(room_code)
+    else:
+        game = room["game"]
+        status = "waiting" if game is None else "finished" if game.phase == "over" else "playing"
+        players = len(room["seats"]) + len(room["bots"])
+        lobby.update(room_code, {
+            "room_code": room_code,
+            "host": room["host"],
+            "status": status,
+            "players": players,
+            "bots": len(room["bots"]),
+            "free": 0 if status == "playing" else max(0, 6 - players),
+        })
+    schedule_lobby()
+
+def schedule_lobby():
+    global lobby_flush
+    if lobby.dirty and lobby_flush is None:
+        lobby_flush = scheduler.call_later(LOBBY_WINDOW, flush_lobby)
+
+def lobby_room(status):
+    # per worker, so a message queue doesn't also hand it every other worker's pushes
+    return f"lobby/{SHARD}/{status}"
+
+def flush_lobby():
+    global lobby_flush
+    lobby_flush = None
+    changes = lobby.drain()
+    for status, (lines, removed) in changes.items():
+        socketio.emit("lobby_update", {"status": status, "rooms": lines, "removed": removed, "total": lobby.counts[status]},
+                      to=lobby_room(status))
+    if feeds:
+        # 📡 the changes to our own rooms, for the other workers' lists
+        lines = [line for lines, _ in changes.values() for line in lines if shard_for(line["room_code"]) == SHARD]
+        removed = [code for _, removed in changes.values() for code in removed if shard_for(code) == SHARD]
+        if lines or removed:
+            for feed in feeds.values():
+                feed.send({"shard": SHARD, "full": False, "lines": lines, "removed": removed})
+
+def own_lines():
+    return [lobby.lines[code] for code in rooms if code in lobby.lines]
+
+def sync_lobby():
+    # 🔄 our whole list to every worker, and forget workers gone quiet
+    now = time.monotonic()
+    for shard, seen in list(peers_seen.items()):
+        if now - seen > 3 * LOBBY_SYNC:
+            del peers_seen[shard]
+            merge_lobby({"shard": shard, "full": True, "lines": [], "removed": []}, seen=False)
+    lines = own_lines()
+    for feed in feeds.values():
+        feed.send({"shard": SHARD, "full": True, "lines": lines, "removed": []})
+    scheduler.call_later(LOBBY_SYNC, sync_lobby)
+
+def merge_lobby(message, seen=True):
+    # another worker's rooms, filed like ours; a full list replaces all of its lines
+    shard = message["shard"]
+    if shard == SHARD:
+        return
+    if message["full"]:
+        if seen and shard not in peers_seen and shard in feeds:
+            feeds[shard].send({"shard": SHARD, "full": True, "lines": own_lines(), "removed": []})  # it just started
+        listed = {line["room_code"] for line in message["lines"]}
+        for code in [code for code in lobby.lines if shard_for(code) == shard and code not in listed]:
+            lobby.remove(code)
+        if seen:
+            peers_seen[shard] = time.monotonic()
+    for code in message["removed"]:
+        if shard_for(code) == shard:
+            lobby.remove(code)
+    for line in message["lines"]:
+        if shard_for(line["room_code"]) == shard:
+            lobby.update(line["room_code"], line)
+    schedule_lobby()
+
+def follow_lobby(sid, status=None):
+    # a sid follows at most one status, and none once it is in a room
+    old = lobby_sids.pop(sid, None)
+    if old and old != status:
+        leave_room(lobby_room(old), sid=sid)
+    if status:
+        if old != status:
+            join_room(lobby_room(status), sid=sid)
+        lobby_sids[sid] = status
+
+def touch(room_code):
+    rooms[room_code]["active"] = time.monotonic()
+
+def room_deadline(room):
+    timeout = IDLE_TIMEOUT if room["seats"] else ABANDON_TIMEOUT
+    return room["active"] + timeout
+
+def watch(room_code):
+    # One timer per room. Activity only moves "active", the timer checks
+    # it when it fires and sets itself again if the room was used since.
+    room = rooms[room_code]
+    if room["reaper"]:
+        room["reaper"].cancel()
+    room["reaper"] = scheduler.call_at(room_deadline(room), check_room, room_code)
+
+def check_room(room_code):
+    global reaped
+    room = rooms.get(room_code)
+    if room is None:
+        return
+    if time.monotonic() < room_deadline(room):
+        watch(room_code)
+    else:
+        reaped += 1
+        close_room(room_code)
+
+def sent_totals(room):
+    room_packets.observe(room["packets"])
+    room_bytes.observe(room["bytes"])
+
+def close_room(room_code):
+    # 🚪 every way a room goes away: its timers, trace, listing, sids and socket rooms
+    room = rooms.pop(room_code)
+    list_room(room_code)
+    sent_totals(room)
+    room["reaper"].cancel()
+    if room["game"]:
+        room["game"].stop()
+    traces.pop(room_code, None)
+    record(room_code, "close")
+    socketio.emit("room_closed", {"room_code": room_code}, to=room_code)
+    for sid in [*room["seats"], *room["spectators"]]:
+        user_sid_to_room.pop(sid, None)
+        user_sid_to_name.pop(sid, None)
+    for name in (room_code, f"{room_code}/json", f"{room_code}/compact"):
+        socketio.close_room(name)
+
+def shard_for(room_code):
+    if not SHARD_URLS:
+        return SHARD
+    return zlib.crc32(room_code.encode()) % len(SHARD_URLS)
 
 def generate_room_code(length=5):
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
+    while True:
+        room_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
+        if shard_for(room_code) == SHARD and room_code not in rooms:
+            return room_code
+
+# The page and its hashed css/js, built once (or read from `python build.py`)
+ASSETS = None
+
+def load_assets():
+    global ASSETS
+    if ASSETS is None:
+        ASSETS = build.load() or build.build()
+    return ASSETS
+
+def serve_asset(name, cache):
+    asset = load_assets().get(name)
+    if asset is None:
+        abort(404)
+    encoding = next((e for e in ("br", "gzip") if e in asset.variants and e in request.accept_encodings), "identity")
+    etag = f"{asset.etag}-{encoding}"
+    headers = {"ETag": f'"{etag}"', "Cache-Control": cache, "Vary": "Accept-Encoding"}
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(asset.variants[encoding], headers=headers, content_type=asset.type)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    # revalidated on every load so a deploy's new asset names are picked up
+    return serve_asset("index.html", "no-cache")
+
+@app.route('/assets/<name>')
+def assets(name):
+    return serve_asset(name, "public, max-age=31536000, immutable")
+
+@app.route('/metrics')
+def metrics_page():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+def admin(fn):
+    # 🔐 404 unless ADMIN_TOKEN is set, 403 without it in the request
+    @wraps(fn)
+    def guarded(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            abort(404)
+        given = request.headers.get("Authorization", "").removeprefix("Bearer ") or request.args.get("token", "")
+        if not hmac.compare_digest(given.encode(), ADMIN_TOKEN.encode()):
+            abort(403)
+        return fn(*args, **kwargs)
+    return guarded
+
+def seconds_arg(default):
+    return min(PROFILE_LIMIT, max(0.1, float(request.args.get("seconds", default))))
+
+@app.route('/admin/profile', methods=["GET", "POST"])
+@admin
+def admin_profile():
+    # POST starts sampling every thread for ?seconds=; GET is the last
+    # profile as collapsed stacks (?format=summary for sample counts)
+    global sampler
+    if request.method == "POST":
+        if sampler and sampler.running:
+            return {"error": "already profiling", **sampler.summary()}, 409
+        sampler = Sampler(seconds_arg(10), max(0.001, float(request.args.get("interval", 0.005))))
+        return sampler.summary(), 202
+    if sampler is None:
+        abort(404)
+    if request.args.get("format") == "summary":
+        return sampler.summary()
+    return Response(sampler.collapsed(), mimetype="text/plain")
+
+@app.route('/admin/trace/<room_code>', methods=["GET", "POST"])
+@admin
+def admin_trace(room_code):
+    # POST records spans for the room for ?seconds=; GET is the last
+    # recording as Chrome trace events
+    if request.method == "POST":
+        if room_code not in rooms:
+            abort(404)
+        traces[room_code] = Trace(room_code, seconds_arg(60))
+        return {"room_code": room_code, "seconds": seconds_arg(60)}, 202
+    if room_code not in traces:
+        abort(404)
+    return traces[room_code].chrome()
+
+@app.route('/internal/lobby', methods=["POST"])
+def lobby_feed():
+    # 📡 lobby messages from another worker (Feed), signed with SECRET_KEY
+    try:
+        batch = peer_messages.loads(request.get_data(as_text=True), max_age=3 * LOBBY_SYNC)
+    except BadSignature:
+        abort(403)
+    for message in batch:
+        merge_lobby(message)
+    return Response(status=204)
+
+@app.route('/stats')
+def stats():
+    idle = sum(1 for room in rooms.values() if not room["seats"])
+    return {
+        "rooms": len(rooms),
+        "live_rooms": len(rooms) - idle,
+        "idle_rooms": idle,
+        "reaped_rooms": reaped,
+        "timers": len(scheduler),
+        "connections": connections,
+        "spectators": sum(len(room["spectators"]) for room in rooms.values()),
+    }
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    global connections
+    connections += 1
+    if isinstance(auth, dict) and auth.get("format") == "compact":
+        wire_formats[request.sid] = "compact"
+
+def new_room(host_sid, host, public=True):
+    return {
+        "host_sid": host_sid,
+        "host": host,
+        "public": public,  # listed in the lobby
+        "seats": Seats(),  # sid <-> username <-> seat
+        "game": None,
+        "spectators": set(),
+        "listeners": {"json": set(), "compact": set()},  # sids getting the table broadcast
+        "table": (0, None, None),  # (version, last table view, its compact form)
+        "patches": deque(maxlen=PATCH_LOG),  # (version, patch, compact patch) for resumes
+        "hands": {},  # sid -> last hand sent
+        "active": time.monotonic(),
+        "packets": 0,
+        "bytes": 0,
+        "reaper": None,
+        "bots": [],  # names of the seats the server plays
+    }
 
-@socketio.on('create_room')
+@on('create_room')
 def handle_create_room(data):
+    if user_sid_to_room.get(request.sid) in rooms:
+        # the sid's seat (or watch) in its room would be left behind
+        emit('join_failed', {"error": "Already in a room"})
+        return
     room_code = generate_room_code()
-    rooms[room_code] = {
-        "host_sid": request.sid,
-        "players": set(),
-        "player_names": {},  # sid -> username
-        "order": [],
-        "game_hands": [],
-        "game_state": {
-            "scores": {"Team_1": [0], "Team_2": [0]},
-            "tricks": {"Team_1": 0, "Team_2": 0},
-            "length": [0, 0, 0, 0, 0, 0],
-            "hands": [],
-            "plays": [Card("", ""), Card("", ""), Card("", ""), Card("", ""), Card("", ""), Card("", "")],
-            "players": [],
-            "bids": ["", "", "", "", "", ""]
-        },
-        "queues": {
-            "bids": Queue(),
-            "play_cards": Queue(),
-            "shoots": Queue(),
-            "give": Queue()
-        }
-    }
+    username = data.get('username')
+    public = data.get('public', True) is not False
+    rooms[room_code] = new_room(request.sid, username, public)
+    watch(room_code)
+    record(room_code, "create", host=username, public=public)
+    follow_lobby(request.sid)
 
     join_room(room_code)
+    listen(room_code, request.sid)
     user_sid_to_room[request.sid] = room_code
-    rooms[room_code]["players"].add(request.sid)
-    username = data.get('username')
+    rooms[room_code]["seats"].join(request.sid, username)
 
     # Assign host a default username
     user_sid_to_name[request.sid] = username
-    rooms[room_code]["player_names"][request.sid] = username  # Add this!
+    list_room(room_code)
 
     # Emit join_success to host with is_host True
     emit('join_success', {
         "room_code": room_code,
         "username": user_sid_to_name[request.sid],
-        "is_host": True
+        "is_host": True,
+        "token": sessions.dumps([room_code, username]),
     }, room=request.sid)
 
-@socketio.on('player_bid')
+@on('player_bid')
 def handle_bid(data):
     sid = request.sid
     room_code = user_sid_to_room.get(sid)
     if not room_code or room_code not in rooms:
         return
 
-    player = user_sid_to_name.get(sid)
-    bid = data
+    game = rooms[room_code]["game"]
+    if game:
+        game.bid(seat_for(room_code, sid), data)
+
+@on('resync')
+def handle_resync():
+    sid = request.sid
+    room_code = user_sid_to_room.get(sid)
+    if not room_code or room_code not in rooms or not rooms[room_code]["game"]:
+        return
+    send_state(room_code, sid)
+
+def in_room(room_code, *sids):
+    return room_code in rooms and all(sid in rooms[room_code]["seats"] for sid in sids)
 
-    # 👇 Feed the card back into the game loop
-    rooms[room_code]["queues"]["bids"].put((player, bid))
+def flush_signals(room_code, sender, target):
+    signals = pending_signals.pop((sender, target), None)
+    if not signals:
+        return
+    if not in_room(room_code, sender, target):
+        relayed_signals.inc("dropped", amount=len(signals))
+        return
+    with counting(room_code):
+        socketio.emit("signal_batch", {"from": sender, "signals": signals}, to=target)
+    signal_batches.inc()
 
-@socketio.on("signal")
+@on('signal')
 def on_signal(data):
+    sid = request.sid
     target = data["target"]
+    room_code = user_sid_to_room.get(sid)
+    if not in_room(room_code, sid, target):
+        # 🚫 The peer left, or never was in this room
+        relayed_signals.inc("dropped")
+        return
+    signal = data["signal"]
+    if signal and signal.get("candidate"):
+        # 🧊 Trickle ICE comes in bursts, send the pair's candidates together
+        relayed_signals.inc("candidate")
+        batch = pending_signals.setdefault((sid, target), [])
+        batch.append(signal)
+        if len(batch) == 1:
+            scheduler.call_later(SIGNAL_WINDOW, flush_signals, room_code, sid, target)
+        return
+    # candidates held back must not overtake a new offer or answer
+    flush_signals(room_code, sid, target)
+    relayed_signals.inc("sdp")
     emit("signal", {
-        "from": request.sid,
-        "signal": data["signal"]
+        "from": sid,
+        "signal": signal
     }, to=target)
 
-@socketio.on('shoot_ans')
+@on('shoot_ans')
 def handle_shoot(data):
     sid = request.sid
     room_code = user_sid_to_room.get(sid)
     if not room_code or room_code not in rooms:
         return
 
-    player = user_sid_to_name.get(sid)
-    shoot = data
-
-    # 👇 Feed the card back into the game loop
-    rooms[room_code]["queues"]["shoots"].put((player, shoot))
+    game = rooms[room_code]["game"]
+    if game:
+        game.shoot(seat_for(room_code, sid), data)
 
-@socketio.on('give_card')
-def handle_play_card(data):
+@on('give_card')
+def handle_give_card(data):
     sid = request.sid
     room_code = user_sid_to_room.get(sid)
     if not room_code or room_code not in rooms:
         return
 
-    player = user_sid_to_name.get(sid)
-    card = data
-
-    # 👇 Feed the card back into the game loop
-    rooms[room_code]["queues"]["give"].put((player, card))
+    game = rooms[room_code]["game"]
+    if game:
+        game.give(seat_for(room_code, sid), data)
 
-@socketio.on('play_card')
+@on('play_card')
 def handle_play_card(data):
     sid = request.sid
     room_code = user_sid_to_room.get(sid)
     if not room_code or room_code not in rooms:
         return
 
-    player = user_sid_to_name.get(sid)
-    card = data
+    game = rooms[room_code]["game"]
+    if game:
+        seat = seat_for(room_code, sid)
+        if not game.play(seat, data) and game.phase == "playing" and game.turn == seat:
+            # 🚫 not in hand or not following suit: the prompt still stands
+            socketio.emit("play_rejected", to=sid)
 
-    # 👇 Feed the card back into the game loop
-    rooms[room_code]["queues"]["play_cards"].put((player, card))
-
-@socketio.on('start_game')
+@on('start_game')
 def handle_start_game(data):
     sid = request.sid
     room_code = user_sid_to_room.get(sid)
     if not room_code or room_code not in rooms:
         return
-    rooms[room_code]["order"].append(rooms[room_code]["player_names"][rooms[room_code]["host_sid"]])
+    game = rooms[room_code]["game"]
+    if game and game.phase != "over":
+        return
+    order = [rooms[room_code]["seats"].name(rooms[room_code]["host_sid"])]
     for point in data:
-        rooms[room_code]["order"].append(point)
-    rooms[room_code]["order"].append(rooms[room_code]["order"].pop(0))
-    rooms[room_code]["game_state"]["players"] = rooms[room_code]["order"]
+        order.append(point)
+    order.append(order.pop(0))
+    rooms[room_code]["seats"].seat(order)
+    rooms[room_code]["game"] = RoomGame(room_code, order)
+    record(room_code, "start", order=order, gid=rooms[room_code]["game"].gid)
     emit("game_started", room=room_code)
-    threading.Thread(target=game_logic, args=(room_code,)).start()
+    rooms[room_code]["game"].start()
+    list_room(room_code)
 
-@socketio.on('join_room')
+@on('join_room')
 def handle_join(data):
     room_code = data.get('room_code')
     username = data.get('username')
@@ -470,177 +949,349 @@ def handle_join(data):
         emit('join_failed', {"error": "No username provided"})
         return
 
+    if room_code and shard_for(room_code) != SHARD:
+        # 🔀 The room lives on another worker, reconnect there and join again
+        emit('join_redirect', {"url": SHARD_URLS[shard_for(room_code)], "room_code": room_code, "username": username})
+        return
+
+    current = user_sid_to_room.get(request.sid)
+    if current in rooms and not (current == room_code and request.sid in rooms[current]["spectators"]):
+        emit('join_failed', {"error": "Already in a room"})
+        return
+
     if room_code in rooms:
-        if username in rooms[room_code]["player_names"].values():
+        room = rooms[room_code]
+        if room["seats"].taken(username) or username in room["bots"]:
             emit('join_failed', {"error": "Username already taken in this room"})
             return
+        if room["seats"].claimed(username) or username == room["host"]:
+            # 🔒 A seat (or the host) is only taken back with its session token
+            emit('join_failed', {"error": "That name has a seat here, rejoin from the device that took it"})
+            return
 
-        join_room(room_code)
-        user_sid_to_room[request.sid] = room_code
-        user_sid_to_name[request.sid] = username
-
-        rooms[room_code]["players"].add(request.sid)
-        rooms[room_code]["player_names"][request.sid] = username
-
+        enter(room_code, request.sid, username)
         # socketio.emit('game_state', game_state, to=request.sid)
-        emit('join_success', {"room_code": room_code, "username": username})
-
-        # 🔁 Send existing user list to the new joiner (for peer connections)
-        existing_users = [
-            sid for sid in rooms[room_code]["players"]
-            if sid != request.sid
-        ]
-        emit('existing_users', {"users": existing_users}, to=request.sid)
-
-        # 🔔 Inform existing users that someone joined (for reverse connections)
-        for sid in existing_users:
-            emit('user_joined', {"sid": request.sid}, to=sid)
-
-        # 👑 Update the host with the full player name list (for dropdowns)
-        host_sid = rooms[room_code]["host_sid"]
-        all_names = [
-            name for sid, name in rooms[room_code]["player_names"].items()
-            if sid != host_sid
-        ]
-        emit('player_list', all_names, to=host_sid)
+        emit('join_success', {"room_code": room_code, "username": username, "token": sessions.dumps([room_code, username])})
+        welcome(room_code, request.sid)
 
     else:
         emit('join_failed', {"error": "Room not found"})
 
+def enter(room_code, sid, username):
+    # 🪑 sid now speaks for username: its socket rooms, seat and host status
+    join_room(room_code, sid=sid)
+    listen(room_code, sid)
+    touch(room_code)
+    user_sid_to_room[sid] = room_code
+    user_sid_to_name[sid] = username
+
+    rooms[room_code]["seats"].join(sid, username)
+    rooms[room_code]["spectators"].discard(sid)
+    if username == rooms[room_code]["host"] and rooms[room_code]["host_sid"] not in rooms[room_code]["seats"]:
+        rooms[room_code]["host_sid"] = sid
+    follow_lobby(sid)
+    list_room(room_code)
+
+def welcome(room_code, sid, seen=0):
+    # 🔁 Send existing user list to the new joiner (for peer connections)
+    existing_users = [
+        other for other in rooms[room_code]["seats"]
+        if other != sid
+    ]
+    emit('existing_users', {"users": existing_users}, to=sid)
+
+    # 🔔 Inform existing users that someone joined (for reverse connections)
+    for other in existing_users:
+        emit('user_joined', {"sid": sid}, to=other)
+
+    # 👑 Update the host with the full player name list (for dropdowns)
+    emit('player_list', player_names(room_code), to=rooms[room_code]["host_sid"])
+
+    # 🪑 Back in a seat of a running game (rejoin, resume, or a restarted server)
+    game = rooms[room_code]["game"]
+    if game and game.phase != "over":
+        if seen:
+            send_since(room_code, sid, seen)
+        else:
+            send_state(room_code, sid)
+        bot_waiting = game.turn is not None and game.players[game.turn] in rooms[room_code]["bots"] and game.deadline is None
+        if seat_for(room_code, sid) == game.turn or bot_waiting:
+            game.reprompt()
+        else:
+            game.rearm()
+
+@on('resume')
+def handle_resume(data):
+    # 📱 A new connection for a player who already joined: take the seat
+    # back from the token, whatever became of the old sid
+    try:
+        room_code, username = sessions.loads(data.get("token", ""), max_age=SESSION_TTL)
+    except BadSignature:
+        emit('resume_failed', {"error": "Session expired"})
+        return
+    if shard_for(room_code) != SHARD:
+        emit('join_redirect', {"url": SHARD_URLS[shard_for(room_code)], "room_code": room_code, "token": data["token"]})
+        return
+    room = rooms.get(room_code)
+    if room is None or username in room["bots"]:
+        emit('resume_failed', {"error": "Room not found"})
+        return
+
+    old = room["seats"].sids.get(username)
+    if old and old != request.sid:
+        room["seats"].leave(old)
+        room["listeners"]["json"].discard(old)
+        room["listeners"]["compact"].discard(old)
+        room["hands"].pop(old, None)
+        user_sid_to_room.pop(old, None)
+        user_sid_to_name.pop(old, None)
+        disconnect(sid=old)
+    enter(room_code, request.sid, username)
+    emit('resume_success', {"room_code": room_code, "username": username, "is_host": room["host_sid"] == request.sid,
+                            "token": sessions.dumps([room_code, username]),
+                            "started": bool(room["game"] and room["game"].phase != "over")})
+    welcome(room_code, request.sid, int(data.get("v") or 0))
+
+def player_names(room_code):
+    # everyone the host can seat: people other than the host, then bots
+    room = rooms[room_code]
+    return [name for sid, name in room["seats"].names.items() if sid != room["host_sid"]] + room["bots"]
+
+@on('add_bot')
+def handle_add_bot(data=None):
+    sid = request.sid
+    room_code = user_sid_to_room.get(sid)
+    if not room_code or room_code not in rooms:
+        return
+    room = rooms[room_code]
+    if sid != room["host_sid"] or room["game"] and room["game"].phase != "over" or len(room["seats"]) + len(room["bots"]) >= 6:
+        return
+    number = 1
+    while f"Bot {number}" in room["bots"] or room["seats"].taken(f"Bot {number}"):
+        number += 1
+    room["bots"].append(f"Bot {number}")
+    record(room_code, "bot", name=f"Bot {number}")
+    list_room(room_code)
+    emit('player_list', player_names(room_code), to=sid)
+
+@on('remove_bot')
+def handle_remove_bot(data):
+    sid = request.sid
+    room_code = user_sid_to_room.get(sid)
+    if not room_code or room_code not in rooms:
+        return
+    room = rooms[room_code]
+    if sid != room["host_sid"] or room["game"] and room["game"].phase != "over" or data.get("name") not in room["bots"]:
+        return
+    room["bots"].remove(data["name"])
+    record(room_code, "unbot", name=data["name"])
+    list_room(room_code)
+    emit('player_list', player_names(room_code), to=sid)
+
+@on('spectate')
+def handle_spectate(data):
+    room_code = data.get('room_code')
+
+    if room_code and shard_for(room_code) != SHARD:
+        emit('join_redirect', {"url": SHARD_URLS[shard_for(room_code)], "room_code": room_code, "spectate": True})
+        return
+
+    if room_code not in rooms:
+        emit('join_failed', {"error": "Room not found"})
+        return
+
+    if user_sid_to_room.get(request.sid) in rooms:
+        # a seated sid would leave its seat behind; one watcher, one room
+        emit('join_failed', {"error": "Already in a room"})
+        return
+
+    # 👀 No seat, no prompts and no voice: just the table broadcast
+    follow_lobby(request.sid)
+    join_room(room_code)
+    listen(room_code, request.sid)
+    user_sid_to_room[request.sid] = room_code
+    rooms[room_code]["spectators"].add(request.sid)
+    emit('spectate_success', {"room_code": room_code})
+    if rooms[room_code]["game"]:
+        send_state(room_code, request.sid)
+
+
+def number(value, default):
+    # a client's integer, or the default for anything else
+    return value if isinstance(value, int) and not isinstance(value, bool) else default
+
+@on('lobby')
+def handle_lobby(data=None):
+    # 📋 A page of public rooms, and lobby_update pushes for that status
+    # until the sid asks for another one or joins a room
+    data = data if isinstance(data, dict) else {}
+    status = data.get("status") if data.get("status") in STATUSES else "waiting"
+    rooms_page, cursor = lobby.page(status, number(data.get("free"), 0), number(data.get("after"), None),
+                                    min(max(number(data.get("limit"), PAGE), 1), 100))
+    if request.sid not in user_sid_to_room:
+        follow_lobby(request.sid, status)
+    emit('lobby_page', {"status": status, "rooms": rooms_page, "next": cursor, "total": lobby.counts[status]})
+
+@on('leave_lobby')
+def handle_leave_lobby(data=None):
+    follow_lobby(request.sid)
+
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    global connections
+    connections -= 1
     sid = request.sid
+    wire_formats.pop(sid, None)
+    for bucket in limits.values():
+        bucket.forget(sid)
+    lobby_sids.pop(sid, None)
     room_code = user_sid_to_room.get(sid)
 
-    if room_code and room_code in rooms:
-        rooms[room_code]["players"].discard(sid)
-        rooms[room_code]["player_names"].pop(sid, None)
-
-        if not rooms[room_code]["players"]:
-            del rooms[room_code]
+    if room_code and room_code in rooms and sid in rooms[room_code]["spectators"]:
+        rooms[room_code]["spectators"].discard(sid)
+        rooms[room_code]["listeners"]["json"].discard(sid)
+        rooms[room_code]["listeners"]["compact"].discard(sid)
+    elif room_code and room_code in rooms:
+        seat = seat_for(room_code, sid)
+        rooms[room_code]["seats"].leave(sid)
+        rooms[room_code]["listeners"]["json"].discard(sid)
+        rooms[room_code]["listeners"]["compact"].discard(sid)
+        rooms[room_code]["hands"].pop(sid, None)
+
+        touch(room_code)
+        game = rooms[room_code]["game"]
+        if game and game.phase != "over" and seat is not None and seat == game.turn:
+            game.arm(seat, grace=True)
+        if not rooms[room_code]["seats"] and not (game and game.phase != "over"):
+            close_room(room_code)
+        elif not rooms[room_code]["seats"]:
+            # 💤 Keep a game in progress around for a while so players can rejoin
+            watch(room_code)
+            list_room(room_code)
         else:
-            host_sid = rooms[room_code]["host_sid"]
-
-            # Exclude host by comparing usernames
-            all_names = [
-                name for sid, name in rooms[room_code]["player_names"].items()
-                if sid != host_sid
-            ]
-            emit('player_list', all_names[1:], to=host_sid)
+            emit('player_list', player_names(room_code), to=rooms[room_code]["host_sid"])
+            list_room(room_code)
 
     user_sid_to_room.pop(sid, None)
     user_sid_to_name.pop(sid, None)
 
-def game_logic(room_code):
-    team_1 = 0
-    team_2 = 0
-    end = False
-    begin = 0
-    while not end:
-        team_1_t = 0
-        team_2_t = 0
-        deck = Deck().initialize_deck().shuffle_deck()
-        hands = sort_hands([[deck.draw_card() for _ in range(8)] for _ in range(6)])
-        rooms[room_code]["game_hands"] = hands
-        update_hands(room_code)
-        render(room_code)
-        bids = get_trump(room_code, begin)
-        highest_bid = 0
-        high = None
-        for bid in bids:
-            if bid.bid > highest_bid:
-                highest_bid = bid.bid
-                high = bid
-        bid_index = (bids.index(high) + begin) % 6
-        rooms[room_code]["game_state"]["bids"] = ["" if x != bid_index else rooms[room_code]["game_state"]["bids"][x] for x in range(6)]
-        render(room_code)
-        start = bid_index
-        if high.bid > 8:
-            high = change_cards(room_code, bid_index)
-            shots = []
-            shots.append(rooms[room_code]["order"][(2 + start) % 6])
-            shots.append(rooms[room_code]["order"][(4 + start) % 6])
-            while team_1_t + team_2_t != 8:
-                plays = get_plays(room_code, start, high, shoots=shots, shoot=True)
-                win_index = get_winner(plays, high)
-                ind = win_index + start
-                ind = ind % 6
-                if (ind) % 2 == 0:
-                    rooms[room_code]["game_state"]["tricks"]["Team_1"] += 1
-                    team_1_t += 1
-                else:
-                    rooms[room_code]["game_state"]["tricks"]["Team_2"] += 1
-                    team_2_t += 1
-                reset_plays(room_code)
-                render(room_code)
-                start = ind
-            if (bid_index) % 2 == 0:
-                if team_1_t == 8:
-                    if high.bid < 11:
-                        team_1 += 16 * (high.bid - 8)
-                    else:
-                        team_1 += 64
-                else:
-                    if high.bid < 11:
-                        team_1 -= 16 * (high.bid - 8)
-                        team_2 += team_2_t
-                    else:
-                        team_1 -= 64
-                        team_2 += team_2_t
+def refresh_sessions():
+    # 🔑 a new token for every seated sid before the one it has expires
+    for room_code, room in rooms.items():
+        for sid in room["seats"]:
+            socketio.emit("session", {"token": sessions.dumps([room_code, room["seats"].name(sid)])}, to=sid)
+    scheduler.call_later(SESSION_TTL / 3, refresh_sessions)
+
+def snapshot():
+    journal.snapshot({
+        code: {"host": room["host"], "public": room["public"], "order": room["seats"].order, "game": room["game"].to_dict() if room["game"] else None,
+               "gid": room["game"].gid if room["game"] else None, "bots": room["bots"]}
+        for code, room in rooms.items()
+    })
+
+def snapshot_loop():
+    snapshot()
+    scheduler.call_later(SNAPSHOT_INTERVAL, snapshot_loop)
+
+def recover():
+    # latest snapshot, then the inputs logged after it
+    state, records = journal.load()
+    for code, saved in state.items():
+        rooms[code] = new_room(None, saved["host"], saved.get("public", True))
+        rooms[code]["seats"].seat(saved["order"])
+        rooms[code]["bots"] = saved.get("bots", [])
+        if saved["game"]:
+            rooms[code]["game"] = RoomGame.from_dict(saved["game"], code, saved["order"])
+            rooms[code]["game"].gid = saved.get("gid") or rooms[code]["game"].gid
+    seeds = {}
+    for rec in records:
+        if rec["op"] == "deal":
+            seeds.setdefault(rec["r"], []).append(rec["seed"])
+    for rec in records:
+        code, op = rec["r"], rec["op"]
+        if op == "create":
+            rooms[code] = new_room(None, rec["host"], rec.get("public", True))
+            continue
+        if op == "close":
+            rooms.pop(code, None)
+            continue
+        if code not in rooms:
+            continue
+        room = rooms[code]
+        if op == "bot":
+            room["bots"].append(rec["name"])
+            continue
+        if op == "unbot":
+            room["bots"].remove(rec["name"])
+            continue
+        if op == "start":
+            room["seats"].seat(rec["order"])
+            room["game"] = RoomGame(code, rec["order"])
+            room["game"].gid = rec.get("gid") or room["game"].gid
+            room["game"].replaying = True
+            room["game"].replay_seeds = seeds.get(code, [])
+            room["game"].start()
+            continue
+        game = room["game"]
+        if game is None:
+            continue
+        game.replaying = True
+        game.replay_seeds = seeds.get(code, [])
+        if game.phase == "pause":
+            # snapshotted mid-pause: the trick ended before this input came in
+            game.end_trick()
+        if op == "bid":
+            game.place_bid(rec["seat"], rec["value"], rec["suit"])
+        elif op == "shoot":
+            game.shoot_cards(rec["seat"], rec["mode"], tuple(rec["takes"]), rec["rid"])
+        elif op == "give":
+            game.give_card(rec["seat"], rec["card"])
+        elif op == "play":
+            game.play_card(rec["seat"], rec["card"])
+    for code, room in rooms.items():
+        watch(code)
+        list_room(code)
+        game = room["game"]
+        if game:
+            game.replaying = False
+            render(code)  # the table a resume or join is sent
+            if game.phase == "pause":
+                game.later(game.trick_pause, game.end_trick)
             else:
-                if team_2_t == 8:
-                    if high.bid < 11:
-                        team_2 += 16 * (high.bid - 8)
-                    else:
-                        team_2 += 64
-                else:
-                    if high.bid < 11:
-                        team_2 -= 16 * (high.bid - 8)
-                        team_1 += team_1_t
-                    else:
-                        team_2 -= 64
-                        team_1 += team_1_t
-        else:
-            while team_1_t + team_2_t != 8:
-                plays = get_plays(room_code, start, high)
-                win_index = get_winner(plays, high)
-                ind = win_index + start
-                ind = ind % 6
-                if (ind) % 2 == 0:
-                    rooms[room_code]["game_state"]["tricks"]["Team_1"] += 1
-                    team_1_t += 1
-                else:
-                    rooms[room_code]["game_state"]["tricks"]["Team_2"] += 1
-                    team_2_t += 1
-                reset_plays(room_code)
-                render(room_code)
-                start = ind
-            if (bid_index) % 2 == 0:
-                if team_1_t < high.bid:
-                    team_1 -= high.bid
-                    team_2 += team_2_t
-                else:
-                    team_1 += team_1_t
-                    team_2 += team_2_t
-            else:
-                if team_2_t < high.bid:
-                    team_2 -= high.bid
-                    team_1 += team_1_t
-                else:
-                    team_2 += team_2_t
-                    team_1 += team_1_t
-
-        rooms[room_code]["game_state"]["scores"]["Team_1"].append(team_1)
-        rooms[room_code]["game_state"]["scores"]["Team_2"].append(team_2)
-        reset_game_state(room_code)
-        render(room_code)
-        begin += 1
-        if team_1 >= 52 or team_2 >= 52 or abs(team_2 - team_1) > 100:
-            if team_1 != team_2:
-                end = True
-                rooms[room_code]["game_state"]["scores"] = {"Team_1": [0], "Team_2": [0]}
-                socketio.to(room_code).emit("winner", {"winner": "Team 1" if team_1 > team_2 else "Team 2"})
+                game.rearm()
+    snapshot()
+    return len(records)
+
+def run_workers(count):
+    # One process per shard on consecutive ports; put them behind a proxy
+    # (or expose the ports) and list their public URLs in SHARD_URLS.
+    port = int(os.environ.get("PORT", 5000))
+    host = os.environ.get("PUBLIC_HOST", "localhost")
+    urls = os.environ.get("SHARD_URLS") or ",".join(f"http://{host}:{port + x}" for x in range(count))
+    workers = [
+        subprocess.Popen([sys.executable, __file__], env=dict(os.environ, SHARD=str(x), PORT=str(port + x), SHARD_URLS=urls,
+                                                    SECRET_KEY=SECRET_KEY))
+        for x in range(count)
+    ]
+    for worker in workers:
+        worker.wait()
 
 if __name__ == '__main__':
-    socketio.run(app, host="0.0.0.0", port=5000)
+    workers = int(os.environ.get("WORKERS", 1))
+    if workers > 1 and "SHARD" not in os.environ:
+        run_workers(workers)
+    else:
+        if JOURNAL_DIR:
+            journal = Journal(os.path.join(JOURNAL_DIR, str(SHARD)))
+            recover()
+            scheduler.call_later(SNAPSHOT_INTERVAL, snapshot_loop)
+        if HISTORY_DIR:
+            history = History(os.path.join(HISTORY_DIR, str(SHARD)))
+        load_assets()
+        scheduler.call_later(SESSION_TTL / 3, refresh_sessions)
+        if len(PEER_URLS) > 1:
+            feeds = {shard: Feed(url, peer_messages.dumps) for shard, url in enumerate(PEER_URLS) if shard != SHARD}
+            sync_lobby()
+        socketio.start_background_task(scheduler.run_async if RUNTIME == "asyncio" else scheduler.run)
+        socketio.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
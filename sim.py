@@ -0,0 +1,299 @@
+"""Headless self-play for tuning bids and checking scoring changes.
+
+Plays whole games with the same Game rules the server runs, but answers
+every prompt in-process with a policy instead of a socket. Each game is
+seeded, so a (seed, policy) pair always plays out the same way, and games
+can be spread over a process pool. Per-hand results stream out as JSON
+lines, or into a hand-history store (history.py).
+
+    python sim.py --games 10000 --workers 8 --seed 1 --out hands.jsonl
+    python sim.py --games 100000 --workers 0 --history hands/
+    python sim.py --games 2000 --policy sim:SimplePolicy --arg partner=2.0
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import random
+import sys
+import time
+from collections import defaultdict
+
+from game import EFFECTIVE_SUIT, JACK, MODES, STRENGTH, Game, get_winner, sort_hand
+from history import History
+
+PLAYERS = ["Seat 1", "Seat 2", "Seat 3", "Seat 4", "Seat 5", "Seat 6"]
+
+
+def bid_weights():
+    # rough tricks each card is worth if its mode is trump
+    weights = []
+    for mode in range(6):
+        row = []
+        for face in range(24):
+            suit, rank = face // 6, face % 6
+            if mode < 4:
+                if rank == JACK and suit == mode:
+                    value = 1.0
+                elif rank == JACK and suit == mode ^ 1:
+                    value = 0.9
+                elif suit == mode:
+                    value = [0.45, 0.5, 0, 0.6, 0.7, 0.8][rank]
+                else:
+                    value = [0, 0, 0, 0, 0.15, 0.5][rank]
+            elif mode == 4:
+                value = [0, 0, 0.05, 0.15, 0.4, 0.8][rank]
+            else:
+                value = [0.8, 0.4, 0.15, 0.05, 0, 0][rank]
+            row.append(value)
+        weights.append(row)
+    return weights
+
+
+BID_WEIGHTS = bid_weights()
+# summed weights for every byte of a hand mask, per mode
+BYTE_WEIGHTS = [[[sum(BID_WEIGHTS[mode][(chunk * 8 + bit) >> 1] for bit in range(8) if byte >> bit & 1) for byte in range(256)] for chunk in range(6)] for mode in range(6)]
+
+
+def hand_strength(hand, mode):
+    chunks = BYTE_WEIGHTS[mode]
+    return (chunks[0][hand & 255] + chunks[1][hand >> 8 & 255] + chunks[2][hand >> 16 & 255]
+            + chunks[3][hand >> 24 & 255] + chunks[4][hand >> 32 & 255] + chunks[5][hand >> 40 & 255])
+
+
+def best_mode(hand):
+    return max(range(6), key=lambda mode: hand_strength(hand, mode))
+
+
+class Policy:
+    """Answers prompts for a seat. Subclasses override any of the four.
+
+    bid returns (value, mode name), shoot returns (mode, takes, rid) and
+    give/play return a card id; everything else about the table can be
+    read off the game.
+    """
+
+    def bid(self, game, seat, prompt):
+        if prompt["mustBid"]:
+            return 4, MODES[best_mode(game.hands[seat])]
+        return 0, "pass"
+
+    def shoot(self, game, seat):
+        mode = best_mode(game.hands[seat])
+        return mode, (0, 0), []
+
+    def give(self, game, seat):
+        return sort_hand(game.hands[seat])[0]
+
+    def play(self, game, seat):
+        return sort_hand(game.legal_cards(seat))[0]
+
+
+class RandomPolicy(Policy):
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def play(self, game, seat):
+        return self.random.choice(sort_hand(game.legal_cards(seat)))
+
+
+class SimplePolicy(Policy):
+    """Bids its best mode from BID_WEIGHTS and plays greedily.
+
+    partner is the tricks it expects its two partners to add, shoot_at the
+    hand strength it needs to shoot.
+    """
+
+    def __init__(self, partner=1.5, shoot_at=6.0, min_bid=4):
+        self.partner = partner
+        self.shoot_at = shoot_at
+        self.min_bid = min_bid
+
+    def bid(self, game, seat, prompt):
+        hand = game.hands[seat]
+        mode = best_mode(hand)
+        strength = hand_strength(hand, mode)
+        highest = prompt["highest"]
+        if strength >= self.shoot_at and highest < 11:
+            return max(highest, 8) + 1, "shoot"
+        value = min(int(strength + self.partner), 8)
+        if not prompt["alreadyShot"] and value > highest and value >= self.min_bid:
+            return value, MODES[mode]
+        if prompt["mustBid"]:
+            return 4, MODES[mode]
+        return 0, "pass"
+
+    def shoot(self, game, seat):
+        hand = game.hands[seat]
+        mode = best_mode(hand)
+        weakest = sorted(sort_hand(hand), key=lambda card: BID_WEIGHTS[mode][card >> 1])
+        return mode, (1, 1), weakest[:2]
+
+    def give(self, game, seat):
+        return max(sort_hand(game.hands[seat]), key=lambda card: BID_WEIGHTS[game.mode][card >> 1])
+
+    def play(self, game, seat):
+        cards = sort_hand(game.legal_cards(seat))
+        mode = game.mode
+        if not game.trick:
+            return max(cards, key=lambda card: STRENGTH[mode][EFFECTIVE_SUIT[mode][card >> 1]][card >> 1])
+        table = STRENGTH[mode][EFFECTIVE_SUIT[mode][game.trick[0] >> 1]]
+        cards.sort(key=lambda card: table[card >> 1])
+        winner = game.trick_seats[get_winner(game.trick, game.high)]
+        if winner % 2 == seat % 2:
+            return cards[0]
+        best = max(table[card >> 1] for card in game.trick)
+        for card in cards:
+            if table[card >> 1] > best:
+                return card
+        return cards[0]
+
+
+class SimGame(Game):
+    def __init__(self, players, seed=None):
+        super().__init__(players, seed)
+        self.pending = None
+        self.records = []
+        self.winner = None
+
+    def prompt(self, seat, event, data=None):
+        self.pending = (seat, event, data)
+
+    def hand_over(self, record):
+        self.records.append(record)
+
+    def finished(self, winner):
+        self.winner = winner
+
+
+def play_game(policies, seed, max_hands=200, game_class=SimGame):
+    """Play one seeded game to the end (or max_hands) and return it."""
+    game = game_class(PLAYERS, seed)
+    game.start()
+    while game.phase != "over" and len(game.records) < max_hands:
+        seat, event, data = game.pending
+        policy = policies[seat]
+        if event == "bid_now":
+            ok = game.place_bid(seat, *policy.bid(game, seat, data))
+        elif event == "play_now":
+            ok = game.play_card(seat, policy.play(game, seat))
+        elif event == "shoot_now":
+            ok = game.shoot_cards(seat, *policy.shoot(game, seat))
+        else:
+            ok = game.give_card(seat, policy.give(game, seat))
+        if not ok:
+            raise RuntimeError(f"{type(policy).__name__} answered {event} illegally in game {seed}")
+    return game
+
+
+def load_policy(spec, kwargs):
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)(**kwargs)
+
+
+_policies = None
+
+
+def init_worker(specs, kwargs):
+    global _policies
+    _policies = [load_policy(spec, kwargs) for spec in specs]
+
+
+def run_game(job):
+    seed, max_hands = job
+    game = play_game(_policies, seed, max_hands)
+    for index, record in enumerate(game.records):
+        record["game"] = seed
+        record["hand"] = index
+    return game.records, game.winner
+
+
+def simulate(specs, kwargs, games, seed=0, workers=1, max_hands=200):
+    """Yield (records, winner) per game in seed order, using a pool if workers > 1."""
+    jobs = [(seed + n, max_hands) for n in range(games)]
+    if workers <= 1:
+        init_worker(specs, kwargs)
+        yield from map(run_game, jobs)
+        return
+    with multiprocessing.Pool(workers, init_worker, (specs, kwargs)) as pool:
+        yield from pool.imap(run_game, jobs, chunksize=max(1, games // (workers * 8)))
+
+
+class Summary:
+    def __init__(self):
+        self.hands = 0
+        self.games = 0
+        self.wins = defaultdict(int)
+        self.made = defaultdict(lambda: [0, 0])  # bid -> [made, played]
+
+    def add(self, records, winner):
+        self.games += 1
+        self.wins[winner] += 1
+        for record in records:
+            self.hands += 1
+            team = record["bidder"] % 2
+            needed = 8 if record["bid"] > 8 else record["bid"]
+            stats = self.made[record["bid"]]
+            stats[0] += record["tricks"][team] >= needed
+            stats[1] += 1
+
+    def report(self, elapsed, out=sys.stderr):
+        print(f"{self.games} games, {self.hands} hands in {elapsed:.1f}s ({self.hands / elapsed:.0f} hands/s)", file=out)
+        print("wins: " + ", ".join(f"{team}: {count}" for team, count in sorted(self.wins.items(), key=str)), file=out)
+        for bid in sorted(self.made):
+            made, played = self.made[bid]
+            label = ["shoot", "double shoot", "triple shoot"][bid - 9] if bid > 8 else f"bid {bid}"
+            print(f"{label:>13}: {played:8d} hands, made {made / played:6.1%}", file=out)
+
+
+def parse_arg(text):
+    key, _, value = text.partition("=")
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return key, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="game n is dealt from seed + n")
+    parser.add_argument("--workers", type=int, default=1, help="0 for one per core")
+    parser.add_argument("--max-hands", type=int, default=200, help="stop a game that runs longer")
+    parser.add_argument("--policy", default="sim:SimplePolicy", help="module:Class for every seat")
+    parser.add_argument("--team2-policy", help="module:Class for seats 2, 4 and 6")
+    parser.add_argument("--arg", action="append", default=[], help="key=value passed to the policy")
+    parser.add_argument("--out", help="write per-hand JSON lines here ('-' for stdout)")
+    parser.add_argument("--history", help="append every hand to the hand-history store in this directory")
+    args = parser.parse_args()
+
+    specs = [args.policy, args.team2_policy or args.policy] * 3
+    kwargs = dict(parse_arg(text) for text in args.arg)
+    workers = args.workers or multiprocessing.cpu_count()
+    out = None
+    if args.out == "-":
+        out = sys.stdout
+    elif args.out:
+        out = open(args.out, "w")
+    history = History(args.history) if args.history else None
+
+    summary = Summary()
+    started = time.perf_counter()
+    for records, winner in simulate(specs, kwargs, args.games, args.seed, workers, args.max_hands):
+        summary.add(records, winner)
+        if out:
+            for record in records:
+                out.write(json.dumps(record, separators=(",", ":")) + "\n")
+        if history is not None:
+            for record in records:
+                history.append(record)
+    if out and out is not sys.stdout:
+        out.close()
+    if history is not None:
+        history.close()
+    summary.report(time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Table-driven trick resolution against the old get_winner (bench/legacy.py).
+
+The old code let a higher off-suit card beat the led suit, so for trump
+suits only tie-free tricks where every card follows the (effective) led
+suit or is trump are compared.
+
+    python -m pytest tests
+"""
+import random
+
+import pytest
+
+import game
+from bench import legacy
+from bench.tricks import legacy_card, random_trick
+
+ROUNDS = 20000
+
+
+def tricks(rounds=ROUNDS):
+    rng = random.Random(11)
+    for _ in range(rounds):
+        mode = rng.randrange(6)
+        yield mode, random_trick(rng, mode, rng.choice([4, 6]))
+
+
+def test_get_winner_matches_legacy():
+    for mode, trick in tricks():
+        want = legacy.get_winner([legacy_card(card) for card in trick], legacy.Bid(8, game.MODES[mode]))
+        got = game.get_winner(trick, game.Bid(8, game.MODES[mode]))
+        assert got == want, (game.MODES[mode], [game.CARD_VALS[card] for card in trick])
+
+
+@pytest.mark.skipif(game.numpy is None, reason="numpy not installed")
+def test_get_winners_matches_get_winner():
+    for size in (4, 6):
+        batch = [(mode, trick) for mode, trick in tricks() if len(trick) == size]
+        modes = [mode for mode, _ in batch]
+        winners = game.get_winners(game.numpy.array([trick for _, trick in batch], dtype=game.numpy.int8), modes)
+        for (mode, trick), got in zip(batch, winners):
+            assert got == game.get_winner(trick, game.Bid(8, game.MODES[mode]))
@@ -0,0 +1,64 @@
+"""Compact encoding for the events sent most often.
+
+Clients can ask for it at connect time with auth {"format": "compact"}.
+They then get game_state, hand, bid_now and play_now with field names
+replaced by positions and cards by face ids (suit * 6 + rank, -1 for
+none), so "10♥" goes out as a number instead of the string "10\u2665".
+Other events are unchanged.
+
+table_view() builds the JSON game_state table. Its compact form, by
+absolute seat, is
+    {0: {0: Team_1 scores, 1: Team_2 scores}, 1: {0: Team_1 tricks, 1: Team_2},
+     2: length, 3: plays, 4: players, 5: bids}
+and patches against it are built by delta.diff as usual. A compact hand
+is [seat, faces], and play_now is [x, bid, mode, first face, legal face
+mask].
+"""
+from game import CARD_VALS, FACE_BY_VAL, MODE_INDEX
+
+
+def face(val):
+    return FACE_BY_VAL[val] if val else -1
+
+
+def table_view(game):
+    # Everything on the table, by absolute seat: one copy for the whole room.
+    # Clients rotate it to their own seat.
+    return {
+        "scores": {team: list(game.scores[team]) for team in ("Team_1", "Team_2")},
+        "tricks": {team: game.tricks[team] for team in ("Team_1", "Team_2")},
+        "length": [hand.bit_count() for hand in game.hands],
+        "plays": [CARD_VALS[play] if play is not None else "" for play in game.plays],
+        "players": list(game.players),
+        "bids": list(game.bids),
+    }
+
+
+def compact_table(view):
+    return {
+        0: {0: view["scores"]["Team_1"], 1: view["scores"]["Team_2"]},
+        1: {0: view["tricks"]["Team_1"], 1: view["tricks"]["Team_2"]},
+        2: view["length"],
+        3: [face(val) for val in view["plays"]],
+        4: view["players"],
+        5: view["bids"],
+    }
+
+
+def pack_prompt(event, data):
+    if event == "bid_now":
+        return [data["highest"], data["alreadyShot"], data["mustBid"]]
+    if event == "hand":
+        return [data["seat"], [FACE_BY_VAL[val] for val in data["hand"]]]
+    if event == "play_now":
+        first = data["first"]
+        return [data["x"], data["high"]["bid"], MODE_INDEX[data["high"]["suit"]],
+                face(first["rank"] + first["suit"]) if first else -1, data["legal"]]
+    return data
+
+
+def pack(event, data):
+    """Encode an outgoing event for a compact client (game_state tables are already compact)."""
+    if event != "game_state":
+        return pack_prompt(event, data)
+    return data